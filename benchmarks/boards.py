@@ -0,0 +1,135 @@
+# Synthetic benchmark boards of any size and density, each stressing one engine hot path
+# Every generator takes (width, height, density, seed) and returns a list-format board; density is the
+# fraction of the free tiles that get filled, and the same arguments always produce the same board
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from entities import *
+
+# Rows needed above the play area for a generator's rules (each rule takes a row, with a blank row between rules)
+RULE_ROW_SPACING = 2
+
+
+# Spells out the given (noun, verb, complement) rules horizontally from the top-left corner, one every other row
+# Returns the first row below the rules
+def place_rules(board, rules):
+    for i, rule in enumerate(rules):
+        for x, text in enumerate(rule):
+            board[i * RULE_ROW_SPACING][x].append(text)
+    return len(rules) * RULE_ROW_SPACING
+
+
+def empty_board(width, height):
+    return [[[] for _ in range(width)] for _ in range(height)]
+
+
+# Returns the coords of every tile at or below the given row
+def free_tiles(width, height, first_row):
+    return [(x, y) for y in range(first_row, height) for x in range(width)]
+
+
+# Lots of (stacked) loose text, so that every parse has many candidate windows and stacked sequences
+def make_heavy_text_board(width, height, density, seed=0):
+    rng = random.Random(seed)
+    board = empty_board(width, height)
+    first_row = place_rules(board, [(Nouns.MOMO, Verbs.IS, Adjectives.YOU)])
+    board[first_row][0].append(Objects.MOMO)
+
+    texts = [*Nouns, *Verbs, *Adjectives]
+    for x, y in free_tiles(width, height, first_row + 1):
+        if rng.random() < density:
+            for _ in range(rng.choice((1, 1, 2, 3))):
+                board[y][x].append(rng.choice(texts))
+    return board
+
+
+# Many YOU objects, so that every move has many independent motions to resolve
+def make_many_yous_board(width, height, density, seed=0):
+    rng = random.Random(seed)
+    board = empty_board(width, height)
+    first_row = place_rules(board, [(Nouns.MOMO, Verbs.IS, Adjectives.YOU)])
+
+    for x, y in free_tiles(width, height, first_row):
+        if rng.random() < density:
+            board[y][x].append(Objects.MOMO)
+    return board
+
+
+# Rows of PUSH rocks with a YOU at the left end of each, so that moving right pushes long chains
+# (density is the fraction of each row filled with rocks)
+def make_push_chains_board(width, height, density, seed=0):
+    board = empty_board(width, height)
+    first_row = place_rules(board, [
+        (Nouns.MOMO, Verbs.IS, Adjectives.YOU),
+        (Nouns.ROCK, Verbs.IS, Adjectives.PUSH)
+    ])
+
+    chain_length = max(1, int((width - 2) * density))
+    for y in range(first_row, height):
+        board[y][0].append(Objects.MOMO)
+        for x in range(1, 1 + chain_length):
+            board[y][x].append(Objects.ROCK)
+    return board
+
+
+# Dense SINK and DEFEAT fields with YOUs scattered through them, so that the reactive pass destroys a lot
+def make_sink_defeat_board(width, height, density, seed=0):
+    rng = random.Random(seed)
+    board = empty_board(width, height)
+    first_row = place_rules(board, [
+        (Nouns.MOMO, Verbs.IS, Adjectives.YOU),
+        (Nouns.WATER, Verbs.IS, Adjectives.SINK),
+        (Nouns.ROCK, Verbs.IS, Adjectives.DEFEAT),
+        (Nouns.WALL, Verbs.HAS, Nouns.FLAG)
+    ])
+
+    for x, y in free_tiles(width, height, first_row):
+        roll = rng.random()
+        if roll < density:
+            board[y][x].append(Objects.WATER if roll < density / 2 else Objects.ROCK)
+            if rng.random() < 0.5:
+                board[y][x].append(Objects.WALL)
+        elif roll < density + (1 - density) / 4:
+            board[y][x].append(Objects.MOMO)
+    return board
+
+
+# A busy mix of everything: rule text, a walled corridor, rocks, water, and a few MOMOs (density is ignored)
+def make_mixed_board(width, height, density=None, seed=0):
+    board = empty_board(width, height)
+    place_rules(board, [
+        (Nouns.MOMO, Verbs.IS, Adjectives.YOU),
+        (Nouns.WALL, Verbs.IS, Adjectives.STOP),
+        (Nouns.ROCK, Verbs.IS, Adjectives.PUSH),
+        (Nouns.WATER, Verbs.IS, Adjectives.SINK),
+        (Nouns.FLAG, Verbs.IS, Adjectives.WIN)
+    ])
+
+    for x in range(width):
+        board[height // 2][x].append(Objects.WALL)
+    for y in range(height):
+        for x in range(6, width, 4):
+            if y % 3 == 0 and y != height // 2:
+                board[y][x].append(Objects.ROCK)
+            elif y % 5 == 1:
+                board[y][x].append(Objects.WATER)
+
+    for x in range(8, width - 2, 9):
+        board[height - 3][x].append(Objects.MOMO)
+    board[height - 1][width - 1].append(Objects.FLAG)
+
+    return board
+
+
+# Map from board kind to generator
+BOARD_GENERATORS = {
+    "heavy_text": make_heavy_text_board,
+    "many_yous": make_many_yous_board,
+    "push_chains": make_push_chains_board,
+    "sink_defeat": make_sink_defeat_board,
+    "mixed": make_mixed_board,
+}
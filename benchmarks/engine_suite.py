@@ -0,0 +1,232 @@
+# Benchmark suite for the engine hot paths on synthetic boards of increasing size and density (see boards.py)
+# Usage: python benchmarks/engine_suite.py [--quick] [--kinds KIND ...] [--output RESULTS.json]
+#                                          [--compare BASELINE.json] [--tolerance 0.25]
+#
+# Writes one JSON document, {"meta": {...}, "results": {case: {"median_us", "min_us", "samples"}}}, to stdout
+# (or to --output). Case names are "<kind>/<width>x<height>/d<density>/<operation>".
+# With --compare, every case is also checked against a previously saved run; a comparison table goes to stderr,
+# and the exit status is 1 if any case got slower than the baseline by more than the tolerance. Cases are compared
+# by their fastest sample (min_us), which is much less sensitive to scheduling noise than the median, and the boards
+# of any regressed cases are re-measured (up to CONFIRM_RUNS times, keeping each case's best) before a regression
+# is reported, so that a one-off slow run does not fail the comparison.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from boards import BOARD_GENERATORS     # also puts src on sys.path
+
+from engine import Level, board_copy
+from levels import read_level, write_level
+
+SIZES = [(15, 12), (35, 25), (70, 50)]      # the editor's default board, the largest it allows, and twice that
+QUICK_SIZES = [(15, 12), (35, 25)]
+DENSITIES = [0.1, 0.4]
+
+SAMPLES = 30
+QUICK_SAMPLES = 20
+
+CONFIRM_RUNS = 3
+
+DEFAULT_TOLERANCE = 0.25
+
+STEP_KEYS = [Level.UP, Level.DOWN, Level.LEFT, Level.RIGHT, Level.WAIT]
+
+DRAW_TILE_SIZE_PX = 32
+DRAW_BACKGROUND_COLOR = (15, 15, 15)
+
+
+# Times run(setup()) once per sample (only run is timed); returns the list of times in seconds
+def sample_times(setup, run, samples):
+    times = []
+    for _ in range(samples):
+        state = setup()
+        start_time = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start_time)
+    return times
+
+
+def summarize(times):
+    return {
+        "median_us": round(statistics.median(times) * 1e6, 2),
+        "min_us": round(min(times) * 1e6, 2),
+        "samples": len(times)
+    }
+
+
+# Returns a fork of the given level after its first board-changing step (so UNDO and RESTART have work to do)
+def stepped_fork(level):
+    stepped = level.fork()
+    for key in STEP_KEYS:
+        if stepped.process_input(key):
+            break
+    return stepped
+
+
+# Returns a map from operation name to timing summary for one board
+def benchmark_board(board, samples, directory):
+    results = {}
+    level = Level(board_copy(board), logging=False)
+
+    results["init"] = summarize(sample_times(
+        lambda: board_copy(board), lambda b: Level(b, logging=False), samples))
+    results["parse_rules_from_board"] = summarize(sample_times(
+        lambda: level, lambda lv: lv.parse_rules_from_board(), samples))
+
+    results["legal_moves"] = summarize(sample_times(lambda: level, lambda lv: lv.legal_moves(), samples))
+    results["fork"] = summarize(sample_times(lambda: level, lambda lv: lv.fork(keep_history=False), samples))
+    for key in STEP_KEYS:
+        results["process_input[%s]" % key] = summarize(sample_times(
+            level.fork, lambda lv: lv.process_input(key), samples))
+    for key in (Level.UNDO, Level.RESTART):
+        results["process_input[%s]" % key] = summarize(sample_times(
+            lambda: stepped_fork(level), lambda lv: lv.process_input(key), samples))
+
+    filename = os.path.join(directory, "board.lvl")
+    results["write_level"] = summarize(sample_times(lambda: None, lambda _: write_level(filename, board), samples))
+    results["read_level"] = summarize(sample_times(lambda: None, lambda _: read_level(filename), samples))
+
+    renderer = get_renderer()
+    if renderer is not None:
+        surface_type, draw_board_onto_viewport = renderer
+        viewport = surface_type((len(board[0]) * DRAW_TILE_SIZE_PX, len(board) * DRAW_TILE_SIZE_PX))
+        draw_board_onto_viewport(viewport, board, DRAW_BACKGROUND_COLOR)   # warm the sprite atlas first
+        results["draw_board_onto_viewport"] = summarize(sample_times(
+            lambda: viewport, lambda v: draw_board_onto_viewport(v, board, DRAW_BACKGROUND_COLOR), samples))
+
+    return results
+
+
+# Returns (pygame.Surface, ui_helpers.draw_board_onto_viewport), or None if pygame is not installed
+# (rendering is an optional extra; the engine cases run without it)
+def get_renderer():
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")    # keep stdout valid JSON
+    try:
+        import pygame as pg
+        from ui_helpers import draw_board_onto_viewport
+    except ImportError:
+        return None
+    return pg.Surface, draw_board_onto_viewport
+
+
+def get_case_prefix(kind, width, height, density):
+    return "%s/%dx%d/d%s/" % (kind, width, height, "-" if density is None else density)
+
+
+# Returns (kind, width, height, density) of the board the given case was measured on
+def parse_case_board(case):
+    kind, size, density, _ = case.split("/", 3)
+    width, height = map(int, size.split("x"))
+    return kind, width, height, None if density == "d-" else float(density[1:])
+
+
+# Runs every operation on each of the given (kind, width, height, density) boards; returns a map from case to summary
+def run_boards(boards, samples):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # untimed warm-up pass, so the first cases are not measured on a cold CPU and cold caches
+        benchmark_board(BOARD_GENERATORS["mixed"](*QUICK_SIZES[-1]), samples, directory)
+
+        for kind, width, height, density in boards:
+            board = BOARD_GENERATORS[kind](width, height, density)
+            prefix = get_case_prefix(kind, width, height, density)
+            for operation, summary in benchmark_board(board, samples, directory).items():
+                results[prefix + operation] = summary
+    return results
+
+
+def run_suite(kinds, sizes, samples):
+    return run_boards([
+        (kind, width, height, density)
+        for kind in kinds
+        for width, height in sizes
+        for density in ([None] if kind == "mixed" else DENSITIES)
+    ], samples)
+
+
+# Re-measures the boards of the given cases and keeps each case's fastest sample across runs (in place)
+def remeasure(results, cases, samples):
+    boards = sorted({parse_case_board(case) for case in cases}, key=str)
+    for case, summary in run_boards(boards, samples).items():
+        if summary["min_us"] < results[case]["min_us"]:
+            results[case]["min_us"] = summary["min_us"]
+
+
+def get_regressions(results, baseline, tolerance):
+    return [
+        case for case, summary in results.items()
+        if case in baseline and summary["min_us"] > baseline[case]["min_us"] * (1 + tolerance)
+    ]
+
+
+# Prints a comparison of the given results against a baseline run to stderr; returns the list of regressed cases
+def compare(results, baseline, tolerance):
+    regressions = get_regressions(results, baseline, tolerance)
+    for case, summary in results.items():
+        if case not in baseline:
+            continue
+        ratio = summary["min_us"] / max(baseline[case]["min_us"], 1e-9)
+        regressed = case in regressions
+        print("%-60s %10.1f us  %10.1f us  %5.2fx %s" % (
+            case, baseline[case]["min_us"], summary["min_us"], ratio, "REGRESSION" if regressed else ""
+        ), file=sys.stderr)
+
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print("%d baseline cases were not run" % len(missing), file=sys.stderr)
+    print("%d of %d compared cases regressed by more than %.0f%%" % (
+        len(regressions), len(set(results) & set(baseline)), tolerance * 100
+    ), file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine hot paths on synthetic boards.")
+    parser.add_argument("--quick", action="store_true", help="fewer sizes and samples")
+    parser.add_argument("--kinds", nargs="+", choices=sorted(BOARD_GENERATORS), default=list(BOARD_GENERATORS),
+                        help="board kinds to run (default: all)")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a previously saved JSON run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown of a case before it counts as a regression")
+    args = parser.parse_args()
+
+    sizes, samples = (QUICK_SIZES, QUICK_SAMPLES) if args.quick else (SIZES, SAMPLES)
+    run = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "samples": samples
+        },
+        "results": run_suite(args.kinds, sizes, samples)
+    }
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        # confirm apparent regressions before reporting them (results then hold each case's best run)
+        for _ in range(CONFIRM_RUNS):
+            regressions = get_regressions(run["results"], baseline, args.tolerance)
+            if not regressions:
+                break
+            remeasure(run["results"], regressions, samples)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(run, file, indent=1)
+    else:
+        print(json.dumps(run, indent=1))
+
+    if args.compare and compare(run["results"], baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
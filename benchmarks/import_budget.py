@@ -0,0 +1,90 @@
+# Import-time budget check for the headless modules; exits with status 1 if any module is over budget
+# or pulls in a display library
+# Usage: python benchmarks/import_budget.py [--repeat N]
+#
+# Each module is imported in a fresh interpreter, so the times include everything the module drags in
+# (but not the interpreter's own startup). The reported time is the median over the runs.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# Map from headless module to its import-time budget (ms); roughly 3x the times measured when the budgets were set
+IMPORT_BUDGETS_MS = {
+    "entities": 5,
+    "engine": 20,
+    "levels": 25,
+    "batch": 20,
+    "analyzer": 30,
+    "replay": 30,
+    "server": 150,
+    "solver": 45,
+    "verify_levels": 90,
+}
+
+# Modules that must never be loaded by importing a headless module (rendering and dialogs)
+FORBIDDEN_MODULES = ["pygame", "tkinter"]
+
+# Run in the fresh interpreter: imports the module and reports the time taken, peak RSS, and any forbidden modules
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, %r)
+start_time = time.perf_counter()
+import %s
+elapsed_ms = (time.perf_counter() - start_time) * 1000
+try:
+    import resource
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    max_rss_kb = None
+print(json.dumps({
+    "import_ms": elapsed_ms,
+    "max_rss_kb": max_rss_kb,
+    "forbidden": [name for name in %r if name in sys.modules]
+}))
+"""
+
+
+# Imports the given module in a fresh interpreter and returns the child's report
+def measure_import(module):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT % (SRC_DIR, module, FORBIDDEN_MODULES)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the headless modules against budgets.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh-interpreter imports per module")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget_ms in IMPORT_BUDGETS_MS.items():
+        measure_import(module)  # warm-up, so bytecode compilation is not timed
+        reports = [measure_import(module) for _ in range(args.repeat)]
+        import_ms = statistics.median(report["import_ms"] for report in reports)
+        forbidden = sorted(set().union(*(report["forbidden"] for report in reports)))
+
+        problems = []
+        if import_ms > budget_ms:
+            problems.append("over budget")
+        if forbidden:
+            problems.append("loaded " + ", ".join(forbidden))
+        failed |= bool(problems)
+
+        print("%-15s %7.1f ms  (budget %3d ms)  max_rss=%-8s %s" % (
+            module, import_ms, budget_ms, "%d KB" % reports[0]["max_rss_kb"] if reports[0]["max_rss_kb"] else "-",
+            "FAIL: " + "; ".join(problems) if problems else "ok"
+        ))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Microbenchmark: property-table bit tests vs. rules_dict lookups on the largest editor board
+# Usage: python benchmarks/property_table.py
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from engine import Level, ADJECTIVE_BITS
+from entities import *
+from boards import make_mixed_board
+
+# Largest board the level editor allows (see BOARD_WIDTH_RANGE/BOARD_HEIGHT_RANGE in level_editor.py)
+BOARD_WIDTH, BOARD_HEIGHT = 35, 25
+
+STEP_KEYS = [Level.RIGHT, Level.DOWN, Level.LEFT, Level.UP, Level.WAIT]
+
+
+# The pre-table query path: an isinstance() check and two nested dict lookups per query
+def get_ruling_via_rules_dict(level, subject, predicate, complement):
+    rule = level.get_rule(subject, predicate)
+    return rule is not None and complement in rule
+
+
+# Queries YOU, STOP and PUSH for every entity on the board (what one step of the engine does)
+def scan_via_rules_dict(level):
+    hits = 0
+    for row in level.board:
+        for tile in row:
+            for entity in tile:
+                for adjective in (Adjectives.YOU, Adjectives.STOP, Adjectives.PUSH):
+                    hits += get_ruling_via_rules_dict(level, entity, Verbs.IS, adjective)
+    return hits
+
+
+def scan_via_property_table(level):
+    properties = level.property_table
+    bits = [ADJECTIVE_BITS[adjective] for adjective in (Adjectives.YOU, Adjectives.STOP, Adjectives.PUSH)]
+    hits = 0
+    for row in level.board:
+        for tile in row:
+            for entity in tile:
+                for bit in bits:
+                    hits += properties[entity] & bit != 0
+    return hits
+
+
+def time_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    level = Level(make_mixed_board(BOARD_WIDTH, BOARD_HEIGHT), logging=False)
+    assert scan_via_rules_dict(level) == scan_via_property_table(level)
+
+    dict_scan = time_per_call(lambda: scan_via_rules_dict(level), 200)
+    table_scan = time_per_call(lambda: scan_via_property_table(level), 200)
+
+    keys = iter(STEP_KEYS * 10 ** 6)
+    step = time_per_call(lambda: level.process_input(next(keys)), 200)
+
+    print(f"board: {BOARD_WIDTH}x{BOARD_HEIGHT}")
+    print(f"full-board YOU/STOP/PUSH scan via rules_dict:       {dict_scan * 1e6:9.1f} us")
+    print(f"full-board YOU/STOP/PUSH scan via property_table:   {table_scan * 1e6:9.1f} us  "
+          f"({dict_scan / table_scan:.1f}x)")
+    print(f"process_input per step:                             {step * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
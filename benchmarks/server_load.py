@@ -0,0 +1,97 @@
+# Load generator for the game server (src/server.py); reports step round-trip latency percentiles
+# Usage: python benchmarks/server_load.py [--sessions N] [--steps T] [--level NAME] [--connect HOST:PORT]
+#
+# Without --connect, a server is started in a subprocess on a free port and stopped afterwards. Every session
+# plays its own random input stream and waits for each reply before sending the next input, so the latencies
+# are full round trips (including the server's queueing behind the other sessions).
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "server.py")
+
+STEP_KEYS = ["up", "down", "left", "right", "wait", "undo"]
+
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply
+
+
+# Plays one session; returns the list of step round-trip times in seconds
+async def run_session(host, port, level, steps, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        await request(reader, writer, {"level": level})
+        latencies = []
+        for _ in range(steps):
+            start_time = time.perf_counter()
+            await request(reader, writer, {"key": rng.choice(STEP_KEYS)})
+            latencies.append(time.perf_counter() - start_time)
+        return latencies
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def run_load(host, port, level, sessions, steps):
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(run_session(host, port, level, steps, seed) for seed in range(sessions)))
+    elapsed = time.perf_counter() - start_time
+    return [latency for latencies in results for latency in latencies], elapsed
+
+
+# Starts the server on a free port; returns (process, host, port)
+def start_server(max_sessions):
+    process = subprocess.Popen(
+        [sys.executable, SERVER_SCRIPT, "--port", "0", "--max-sessions", str(max_sessions)],
+        stdout=subprocess.PIPE, text=True
+    )
+    address = process.stdout.readline().split()[-1]    # "listening on HOST:PORT"
+    host, port = address.rsplit(":", 1)
+    return process, host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure game server step latency under concurrent sessions.")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=200, help="inputs per session")
+    parser.add_argument("--level", default="level_1")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="use a running server instead of starting one")
+    args = parser.parse_args()
+
+    process = None
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        port = int(port)
+    else:
+        process, host, port = start_server(args.sessions)
+
+    try:
+        latencies, elapsed = asyncio.run(run_load(host, port, args.level, args.sessions, args.steps))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print("%d sessions x %d steps in %.2f s (%.0f steps/s)" % (
+        args.sessions, args.steps, elapsed, len(latencies) / elapsed))
+    print("step latency: p50 %.2f ms, p99 %.2f ms, max %.2f ms" % (
+        percentiles[49] * 1000, percentiles[98] * 1000, max(latencies) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Static dead-state detection; decides quickly (and conservatively) when a Level can no longer be won
+# (does not require pygame)
+#
+# Every check here is sound: a level is only reported dead when no sequence of moves (UNDO and RESTART aside) can
+# win it. Anything the checks cannot rule out counts as winnable, so a live report proves nothing.
+#
+# The reasoning rests on three facts about the engine:
+#  - rules only change when the board is re-parsed, which only happens after something moved, and only YOUs move;
+#  - text is never created (transforms and HAS only make Objects), and is only moved by being pushed;
+#  - a pushed entity moves away from its pusher, so text in the first or last column (row) can never leave it.
+
+from engine import ADJECTIVE_BITS
+from entities import *
+
+# Reasons reported by find_dead_reason()
+NO_YOU = "nothing is or can become YOU"
+NO_WIN = "nothing is or can become WIN"
+
+
+# Returns every entity that is on the board or can be made from one by the current rules (transforms and HAS),
+# i.e. everything that can exist for as long as the rules stay as they are
+def get_reachable_entities(level):
+    reachable = {entity for entity, positions in level.entity_positions.items() if positions}
+    pending = list(reachable)
+    while pending:
+        entity = pending.pop()
+        made = list(level.transform_table.get(entity, ()))
+        has = level.get_rule(entity, Verbs.HAS)
+        if has is not None:
+            made += [noun_object_map[noun] for noun in has]
+        for made_entity in made:
+            if made_entity not in reachable:
+                reachable.add(made_entity)
+                pending.append(made_entity)
+    return reachable
+
+
+# Returns true unless it is certain that no future parse of the board can find a 'Noun IS adjective' rule
+# (i.e. the text needed for one is missing, or locked where it can never complete a rule)
+def can_form_rule(level, adjective):
+    noun_positions = [coords for noun in Nouns for coords in level.entity_positions[noun]]
+    is_positions = level.entity_positions[Verbs.IS]
+    adjective_positions = level.entity_positions[adjective]
+
+    # a horizontal rule needs the noun in columns 0 to width - 3, IS in 1 to width - 2, and the adjective in 2+,
+    # so none of them may be locked in the wrong edge column (and likewise for vertical rules and rows)
+    def can_form_along(axis, length):
+        return (
+            length >= 3 and
+            any(coords[axis] < length - 1 for coords in noun_positions) and
+            any(0 < coords[axis] < length - 1 for coords in is_positions) and
+            any(coords[axis] > 0 for coords in adjective_positions)
+        )
+
+    return can_form_along(0, level.width) or can_form_along(1, level.height)
+
+
+# Returns a short description of why the given level can provably no longer be won, or None if it might still be
+def find_dead_reason(level):
+    if level.has_won:
+        return None
+
+    properties = level.property_table
+    you_bit = ADJECTIVE_BITS[Adjectives.YOU]
+    win_bit = ADJECTIVE_BITS[Adjectives.WIN]
+
+    # until something moves the rules stay as they are, and only what is reachable under them can exist;
+    # without a YOU among that nothing ever moves, so the rules never change at all
+    reachable = get_reachable_entities(level)
+    if not any(properties[entity] & you_bit for entity in reachable):
+        return NO_YOU
+
+    # a win needs a YOU and a WIN on one tile: either under the current rules, or under rules a later parse finds
+    if any(properties[entity] & win_bit for entity in reachable):
+        return None
+    if not can_form_rule(level, Adjectives.WIN):
+        return NO_WIN
+    return None
+
+
+# Returns true iff the given level can provably no longer be won
+def is_dead(level):
+    return find_dead_reason(level) is not None
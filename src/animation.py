@@ -0,0 +1,183 @@
+# Tile-motion animation; slides moving entities between their old and new tiles after each step
+
+import pygame as pg
+
+from ui_helpers import *
+
+
+# Returns the list of (entity, from_coords, to_coords) moves in the given Level operations (of one step that left
+# the given board), with consecutive moves of the same entity within the step merged into one
+# A move only continues an earlier one when no copy of the entity that was already in the tile is left to take,
+# since removals take a tile's original copies (lower in the tile) before the copies that arrived during the step
+def get_moves(operations, board):
+    # copies of each touched (entity, coords) before the step: those on the board now, minus arrivals, plus departures
+    stationary = {}
+    for entity, from_coords, to_coords, _ in operations:
+        for coords, change in ((to_coords, -1), (from_coords, 1)):
+            if coords is not None:
+                key = (entity, coords)
+                if key not in stationary:
+                    x, y = coords
+                    stationary[key] = board[y][x].count(entity)
+                stationary[key] += change
+
+    moves = []
+    in_flight = {}  # map from (entity, coords) to the indices of the moves that brought copies there, oldest first
+    for entity, from_coords, to_coords, index in operations:
+        move_index = None
+        if from_coords is not None:
+            key = (entity, from_coords)
+            if stationary[key] > 0:
+                stationary[key] -= 1
+            elif in_flight.get(key):
+                # forward steps take the lowest (earliest) arrival; UNDO (index None) takes the most recent one
+                move_index = in_flight[key].pop(0 if index is not None else -1)
+
+        if to_coords is None:
+            continue
+        if from_coords is None:
+            stationary[(entity, to_coords)] += 1    # created in place
+            continue
+
+        if move_index is None:
+            move_index = len(moves)
+            moves.append((entity, from_coords, to_coords))
+        else:
+            moves[move_index] = (entity, moves[move_index][1], to_coords)
+        in_flight.setdefault((entity, to_coords), []).append(move_index)
+
+    return [move for move in moves if move[1] != move[2]]
+
+
+# Animates one step at a time; the viewport surface always holds the final (post-step) board, while a cached
+# background layer holds the same board minus the entities currently in flight
+# Only the moving sprites are blitted each frame; the board itself is never redrawn while animating
+class MotionAnimator:
+    def __init__(self, duration_ms, fps):
+        self.duration_ms = duration_ms
+        self.frame_count = max(1, round(duration_ms * fps / 1000))
+
+        self.screen = None
+        self.viewport = None
+        self.viewport_rect = None
+        self.background = None
+
+        self.frames = []            # precomputed [(image, viewport-relative rect), ...] for each frame
+        self.start_ticks = None     # None when no animation is running
+        self.drawn_rects = []       # viewport-relative rects covered by sprites in the last rendered frame
+        self.arrival_rects = []     # viewport-relative rects of the tiles the moving entities arrive at
+        self.pending_rects = []     # viewport-relative rects blitted to the screen but not yet flushed to the display
+
+    # Attaches the animator to a (new) screen and fully drawn viewport; cancels any running animation
+    def reset(self, screen, viewport, viewport_rect):
+        self.screen = screen
+        self.viewport = viewport
+        self.viewport_rect = viewport_rect
+        self.background = viewport.copy()
+        self.start_ticks = None
+        self.drawn_rects = []
+        self.arrival_rects = []
+        self.pending_rects = []
+
+    @property
+    def running(self):
+        return self.start_ticks is not None
+
+    # Starts animating the given step; the changed tiles must already be redrawn onto the viewport
+    # Returns false if the step moved nothing (the changed tiles are then left for the caller to show)
+    def start(self, board, operations, changed_tiles, bg_color):
+        self.finish()
+
+        moves = get_moves(operations, board)
+        tile_size_px = get_tile_size_px(self.viewport, board)
+
+        # background: the changed tiles as they end up, without the entities that are still in flight
+        arrivals = {}
+        for entity, _, to_coords in moves:
+            arrivals.setdefault(to_coords, []).append(entity)
+        for x, y in changed_tiles:
+            rect = pg.Rect(tile_size_px * x, tile_size_px * y, tile_size_px, tile_size_px)
+            if (x, y) in arrivals:
+                tile_contents = board[y][x][:]
+                for entity in arrivals[(x, y)]:
+                    if entity in tile_contents:
+                        tile_contents.remove(entity)
+                self.background.fill(bg_color, rect)
+                draw_tile_onto_viewport(self.background, tile_contents, x, y, tile_size_px)
+            else:
+                self.background.blit(self.viewport, rect, area=rect)
+            if moves:
+                self.screen.blit(self.background, rect.move(self.viewport_rect.topleft), area=rect)
+        self.arrival_rects = [
+            pg.Rect(tile_size_px * x, tile_size_px * y, tile_size_px, tile_size_px) for x, y in arrivals
+        ]
+
+        if not moves:
+            return False
+
+        # every changed tile goes out with the first display update (sprites alone do not cover e.g. transformed
+        # tiles, or the part of a departure tile that the first frame has already moved past)
+        self.pending_rects = [
+            pg.Rect(tile_size_px * x, tile_size_px * y, tile_size_px, tile_size_px) for x, y in changed_tiles
+        ]
+
+        # precompute every interpolated frame
+        self.frames = []
+        for i in range(1, self.frame_count + 1):
+            t = i / self.frame_count
+            self.frames.append([
+                (get_entity_image(entity, tile_size_px), pg.Rect(
+                    round(tile_size_px * (from_x + (to_x - from_x) * t)),
+                    round(tile_size_px * (from_y + (to_y - from_y) * t)),
+                    tile_size_px, tile_size_px
+                ))
+                for entity, (from_x, from_y), (to_x, to_y) in moves
+            ])
+
+        self.start_ticks = pg.time.get_ticks()
+        self.drawn_rects = []
+        self.advance()
+        return True
+
+    # Renders the frame due at the current time; the last frame ends the animation
+    def advance(self):
+        if not self.running:
+            return
+
+        elapsed_ms = pg.time.get_ticks() - self.start_ticks
+        frame_index = min(self.frame_count - 1, elapsed_ms * self.frame_count // self.duration_ms)
+        if frame_index == self.frame_count - 1:
+            self.finish()
+            return
+
+        sprites = self.frames[frame_index]
+        self.restore(self.drawn_rects, self.background)
+        for image, rect in sprites:
+            self.screen.blit(image, rect.move(self.viewport_rect.topleft))
+
+        dirty_rects = self.pending_rects + self.drawn_rects + [rect for _, rect in sprites]
+        self.drawn_rects = [rect for _, rect in sprites]
+        self.pending_rects = []
+        pg.display.update([rect.move(self.viewport_rect.topleft) for rect in dirty_rects])
+
+    # Ends the running animation (if any) by showing the final board wherever sprites were drawn
+    def finish(self):
+        if not self.running:
+            return
+
+        self.restore(self.arrival_rects, self.viewport, self.background)
+        self.restore(self.drawn_rects, self.viewport)
+        dirty_rects = self.pending_rects + self.drawn_rects + self.arrival_rects
+        pg.display.update([rect.move(self.viewport_rect.topleft) for rect in dirty_rects])
+
+        self.start_ticks = None
+        self.drawn_rects = []
+        self.arrival_rects = []
+        self.pending_rects = []
+
+    # Copies the given viewport-relative rects from a source layer to the screen (and optionally to another layer)
+    def restore(self, rects, source, target=None):
+        for rect in rects:
+            self.screen.blit(source, rect.move(self.viewport_rect.topleft), area=rect)
+            if target is not None:
+                target.blit(source, rect, area=rect)
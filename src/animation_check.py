@@ -0,0 +1,154 @@
+# Checks of the step animation; exits with status 1 if any check fails
+# Usage: python animation_check.py   (requires pygame; runs with the dummy video driver unless SDL_VIDEODRIVER is set)
+#
+# - get_moves() on steps that move several entities of one kind (and on their UNDO)
+# - the display updates of an animated step: every tile the step changed must be flushed to the display by the time
+#   the animation ends (the screen surface alone can look right while the window still shows stale pixels)
+
+import os
+import sys
+from collections import Counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from animation import MotionAnimator, get_moves
+from engine import Level
+from entities import *
+from main import update_changed_tiles, update_screen, get_viewport_rect, ANIMATION_DURATION_MS, TARGET_FPS
+from ui_helpers import pg
+
+M = Objects.MOMO
+R = Objects.ROCK
+
+SCREEN_SIZE_PX = (400, 300)
+
+
+# Returns a 5x3 board with 'MOMO IS YOU' and the given 'ROCK IS ...' complement spelled out, and the given
+# entities placed along the bottom row (a map from x to entity list)
+def make_board(bottom_row, rock_complement=Adjectives.PUSH):
+    board = [[[] for _ in range(5)] for _ in range(3)]
+    board[0][0:3] = [[Nouns.MOMO], [Verbs.IS], [Adjectives.YOU]]
+    board[1][0:3] = [[Nouns.ROCK], [Verbs.IS], [rock_complement]]
+    for x, entities in bottom_row.items():
+        board[2][x] = list(entities)
+    return board
+
+
+# Returns a 5x5 board on which MOMO moving up pushes IS between ROCK and FLAG, turning the rock at (4, 4) into a flag
+def make_transform_board():
+    board = [[[] for _ in range(5)] for _ in range(5)]
+    board[0][0:3] = [[Nouns.MOMO], [Verbs.IS], [Adjectives.YOU]]
+    board[1][0], board[1][2] = [Nouns.ROCK], [Nouns.FLAG]
+    board[2][1] = [Verbs.IS]
+    board[3][1] = [M]
+    board[4][4] = [R]
+    return board
+
+
+# (description, board, key, expected moves of the step, expected moves of its UNDO)
+MOVE_CASES = [
+    (
+        "MOMO pushes two rocks",
+        make_board({0: [M], 1: [R], 2: [R]}), Level.RIGHT,
+        [(M, (0, 2), (1, 2)), (R, (1, 2), (2, 2)), (R, (2, 2), (3, 2))],
+        [(R, (3, 2), (2, 2)), (R, (2, 2), (1, 2)), (M, (1, 2), (0, 2))]
+    ),
+    (
+        "two adjacent MOMOs move right",
+        make_board({0: [M], 1: [M]}), Level.RIGHT,
+        [(M, (0, 2), (1, 2)), (M, (1, 2), (2, 2))],
+        [(M, (2, 2), (1, 2)), (M, (1, 2), (0, 2))]
+    ),
+    (
+        "two adjacent MOMOs move left",
+        make_board({1: [M], 2: [M]}), Level.LEFT,
+        [(M, (1, 2), (0, 2)), (M, (2, 2), (1, 2))],
+        [(M, (1, 2), (2, 2)), (M, (0, 2), (1, 2))]
+    ),
+    (
+        # with ROCK IS YOU, the first rock pushes the second and is then moved again as the second YOU in order
+        "a YOU rock pushes a YOU rock and moves on",
+        make_board({1: [R], 2: [R]}, Adjectives.YOU), Level.RIGHT,
+        [(R, (1, 2), (2, 2)), (R, (2, 2), (3, 2))],
+        [(R, (3, 2), (2, 2)), (R, (2, 2), (1, 2))]
+    ),
+]
+
+# (description, board, keys); every key is played through the animator, each followed by its UNDO
+DISPLAY_CASES = [
+    ("MOMO pushes two rocks, twice", make_board({0: [M], 1: [R], 2: [R]}), [Level.RIGHT, Level.RIGHT]),
+    ("a rule change transforms a rock", make_transform_board(), [Level.UP]),
+]
+
+
+def check_moves(board, key, expected_moves, expected_undo_moves):
+    level = Level(board, logging=False)
+    level.process_input(key)
+    moves = get_moves(level.last_operations, level.board)
+    level.process_input(Level.UNDO)
+    undo_moves = get_moves(level.last_operations, level.board)
+
+    if Counter(moves) == Counter(expected_moves) and Counter(undo_moves) == Counter(expected_undo_moves):
+        return None
+    return "moves %s / undo %s" % (moves, undo_moves)
+
+
+# Returns the changed tiles of the given step that never reached the display while it was animated, or []
+def find_unflushed_tiles(screen, level, viewport, viewport_rect, animator):
+    flushed = pg.mask.Mask(screen.get_size())
+    real_update = pg.display.update
+
+    def recording_update(rects=None):
+        if rects is None:
+            rects = [screen.get_rect()]
+        elif isinstance(rects, pg.Rect):
+            rects = [rects]
+        for rect in rects:
+            flushed.draw(pg.mask.Mask(rect.size, fill=True), rect.topleft)
+        real_update(rects)
+
+    pg.display.update = recording_update
+    try:
+        update_changed_tiles(screen, level, viewport, viewport_rect, animator)
+        animator.finish()
+    finally:
+        pg.display.update = real_update
+
+    tile_size_px = viewport_rect.width // level.width
+    unflushed = []
+    for x, y in sorted(level.changed_tiles):
+        rect = pg.Rect(tile_size_px * x, tile_size_px * y, tile_size_px, tile_size_px).move(viewport_rect.topleft)
+        if flushed.overlap_area(pg.mask.Mask(rect.size, fill=True), rect.topleft) != rect.width * rect.height:
+            unflushed.append((x, y))
+    return unflushed
+
+
+def check_display(board, keys):
+    level = Level(board, logging=False)
+    screen = pg.display.set_mode(SCREEN_SIZE_PX)
+    viewport_rect = get_viewport_rect(*SCREEN_SIZE_PX, level.width, level.height)
+    viewport = pg.Surface(viewport_rect.size)
+    update_screen(screen, level, viewport, viewport_rect)
+    animator = MotionAnimator(ANIMATION_DURATION_MS, TARGET_FPS)
+    animator.reset(screen, viewport, viewport_rect)
+
+    for key in keys + [Level.UNDO] * len(keys):
+        if level.process_input(key):
+            unflushed = find_unflushed_tiles(screen, level, viewport, viewport_rect, animator)
+            if unflushed:
+                return "%s left tiles %s unflushed" % (key, unflushed)
+    return None
+
+
+def main():
+    pg.display.init()
+    failures = [(description, check_moves(*case)) for description, *case in MOVE_CASES] + \
+               [(description, check_display(*case)) for description, *case in DISPLAY_CASES]
+    for description, failure in failures:
+        print("%-45s %s" % (description, "ok" if failure is None else "FAIL: " + failure))
+    sys.exit(1 if any(failure is not None for _, failure in failures) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
-# Loading Assets from disc
+# Loading Assets from disc (on demand)
 
-import pygame as pg
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pygame as pg
 
 ASSETS_DIRECTORY_NAME = "assets"
 ASSETS_DIRECTORY_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), ASSETS_DIRECTORY_NAME)
 
-# --- Load All Image Assets --- #
+# --- Image Asset Manifest --- #
 src_image_filenames = [
     "momo_128.png",
     "wall_128.png",
@@ -14,9 +16,72 @@ src_image_filenames = [
     "flag_128.png",
     "water_128.png",
 ]
-src_images = {}
-for filename in src_image_filenames:
-    id = "_".join(filename.split("_")[:-1]) + "_src"
-    path = os.path.join(ASSETS_DIRECTORY_PATH, filename)
-    image = pg.image.load(path)
-    src_images.update({id: image})
+# map from image id (e.g. "momo_src") to filename
+src_image_manifest = {
+    "_".join(filename.split("_")[:-1]) + "_src": filename
+    for filename in src_image_filenames
+}
+
+
+# Mapping from image id to Surface that only decodes an image when it is first requested (or preloaded)
+# Images are converted to the display's pixel format (convert_alpha) once a display exists, since blitting
+# unconverted surfaces is much slower
+class AssetRegistry:
+    def __init__(self, manifest, directory=ASSETS_DIRECTORY_PATH, max_workers=None):
+        self.manifest = manifest
+        self.directory = directory
+        self.max_workers = max_workers
+
+        self.images = {}            # map from id to decoded Surface
+        self.converted = set()      # ids of the images already converted to the display format
+        self.pending = {}           # map from id to the Future of a decode started by preload()
+        self.executor = None        # created by the first preload()
+        self.lock = threading.Lock()
+
+        # a forked child (e.g. the editor's playtest process) has none of the parent's decoding threads
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def __contains__(self, id):
+        return id in self.manifest
+
+    def load(self, id):
+        return pg.image.load(os.path.join(self.directory, self.manifest[id]))
+
+    # Starts decoding the given ids (default: the whole manifest) in parallel on a thread pool; does not wait
+    def preload(self, ids=None):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="assets")
+            for id in (self.manifest if ids is None else ids):
+                if id not in self.images and id not in self.pending:
+                    self.pending[id] = self.executor.submit(self.load, id)
+
+    # Returns the image with the given id, waiting for (or doing) its decode if necessary
+    def __getitem__(self, id):
+        with self.lock:
+            image = self.images.get(id)
+            if image is None:
+                future = self.pending.pop(id, None)
+                image = future.result() if future is not None else self.load(id)
+
+            if id not in self.converted and pg.display.get_surface() is not None:
+                image = image.convert_alpha()
+                self.converted.add(id)
+
+            self.images[id] = image
+            return image
+
+    def reset_after_fork(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.executor = None
+
+
+src_images = AssetRegistry(src_image_manifest)
@@ -0,0 +1,54 @@
+# Batched simulation; steps many Levels of the same board shape in lockstep (does not require pygame)
+
+from engine import Level
+
+
+class LevelBatch:
+    # boards must all have the same (height, width)
+    def __init__(self, boards):
+        if len(boards) == 0:
+            raise ValueError("Invalid batch; at least one board is required.")
+
+        # shared between all instances, so each distinct set of rules is only tabulated once
+        self.rule_table_cache = {}
+        self.levels = [Level(board, logging=False, rule_table_cache=self.rule_table_cache) for board in boards]
+
+        shape = (self.levels[0].height, self.levels[0].width)
+        if any((level.height, level.width) != shape for level in self.levels):
+            raise ValueError("Invalid batch; all boards must have the same shape.")
+
+    def __len__(self):
+        return len(self.levels)
+
+    @property
+    def boards(self):
+        return [level.board for level in self.levels]
+
+    @property
+    def has_won(self):
+        return [level.has_won for level in self.levels]
+
+    # Sends one input key to each level (None skips that level); levels that have already won are not stepped
+    # Returns the list of has_won flags after the step
+    def step(self, keys):
+        if len(keys) != len(self.levels):
+            raise ValueError("Invalid keys; expected one key per level.")
+
+        for level, key in zip(self.levels, keys):
+            if key is not None and not level.has_won:
+                level.process_input(key)
+
+        return self.has_won
+
+    # Advances every level through its own input stream; inputs is an N x T array (or list of N lists) of keys
+    # Returns the per-step has_won flags as a list of N lists of length T
+    def run(self, inputs):
+        if len(inputs) != len(self.levels):
+            raise ValueError("Invalid inputs; expected one input stream per level.")
+
+        won = [[] for _ in self.levels]
+        for keys in zip(*inputs):
+            for flags, has_won in zip(won, self.step(keys)):
+                flags.append(has_won)
+
+        return won
@@ -1,8 +1,14 @@
 # Game Engine
 
-import itertools
+import copy
+import math
+import random
+import time
+from collections import Counter
+from functools import lru_cache
 
 from entities import *
+from instrumentation import LoggingHook
 
 
 # Valid rule patterns
@@ -14,6 +20,22 @@ RULE_PATTERNS = [
 # The maximum parsed length of a valid rule pattern
 MAX_RULE_LENGTH = max(len(rule) for rule in RULE_PATTERNS)
 
+# RULE_PATTERNS compiled to the set of concrete entities accepted at each position (see matches_pattern())
+COMPILED_RULE_PATTERNS = [
+    [
+        frozenset(e for e in all_entities if e == target or (isinstance(target, type) and isinstance(e, target)))
+        for target in pattern
+    ]
+    for pattern in RULE_PATTERNS
+]
+
+# Map from all Adjectives to the bit representing them in a property mask
+ADJECTIVE_BITS = {adjective: 1 << i for i, adjective in enumerate(Adjectives)}
+
+# Zobrist hashing parameters (the seed is fixed so that state hashes are reproducible across runs)
+ZOBRIST_SEED = 0x4D4F4D4F
+HASH_MASK = (1 << 64) - 1
+
 
 # --- Primary Engine Class; handles all game logic --- #
 class Level:
@@ -25,8 +47,20 @@ class Level:
     WAIT = "wait"
     UNDO = "undo"
     RESTART = "restart"
-
-    def __init__(self, board, logging=True):
+    INPUT_KEYS = [UP, DOWN, LEFT, RIGHT, WAIT, UNDO, RESTART]
+
+    # map from direction keys to the displacement vector of a move
+    DIRECTION_VECTORS = {
+        UP: (0, -1),
+        DOWN: (0, 1),
+        LEFT: (-1, 0),
+        RIGHT: (1, 0)
+    }
+
+    # board is a list of rows of tiles (lists of Entities)
+    # logging attaches an instrumentation.LoggingHook (which logs to the standard logging module, not stdout)
+    # rule_table_cache is an optional dict shared between Levels so that identical rule sets are only tabulated once
+    def __init__(self, board, logging=True, rule_table_cache=None):
         if len(board) == 0 or len(board[0]) == 0:
             raise ValueError("Invalid board shape; board cannot be empty.")
 
@@ -37,121 +71,363 @@ class Level:
             raise ValueError("Invalid board contents; board can only contain Entities.")
 
         self.board = board
+        self.start_board = board_copy(board)    # pristine copy used by RESTART (never modified; rows may be shared)
         self.height = len(board)
         self.width = len(board[0])
 
-        self.logging = logging     # logging enabled by default
+        self.zobrist_keys = get_zobrist_keys(self.width, self.height)
+        self.board_hash = self.compute_board_hash()
+
+        # spatial index; maintained by add_entity() and remove_entity()
+        self.entity_positions = {}      # map from all entities to a map from the coords they occupy to their count
+        self.occupied_tiles = set()     # coords of all non-empty tiles
+        self.build_spatial_index()
 
+        # copy-on-write bookkeeping; rows and index entries not listed here may be shared with forks
+        # (see fork()) and are copied before their first modification
+        self.owned_rows = set(range(self.height))   # indices of the board rows this level may modify in place
+        self.owned_positions = set(all_entities)    # entities whose entity_positions map this level may modify
+        self.owns_occupied_tiles = True
+
+        # instrumentation subscribers (see instrumentation.py); phases are only timed while any are attached
+        self.hooks = [LoggingHook()] if logging else []
+        self.phase_counters = Counter()     # counters collected during the phase in progress (only while hooked)
+
+        # rule lookup tables; rebuilt (never modified in place) whenever the rules change
+        self.rule_table_cache = rule_table_cache
         self.rules_dict = {}
+        self.property_masks = {}    # map from all Objects (and Text) to a mask of their ADJECTIVE_BITS
+        self.property_table = {}    # map from all entities to their property mask (Text entities share one)
+        self.transform_table = {}   # map from entities to the Objects they become under 'Noun IS Noun'
         self.implicit_rules = [(Text, Verbs.IS, Adjectives.PUSH)]
-        self.parse_rules_from_board()
 
-        self.board_history = []
+        self.rule_counts = Counter()    # multiset of all rules currently spelled out on the board
+        self.window_rules = {}          # map from each text window (x, y, dx, dy) to the rules it spells out
+        self.dirty_text_tiles = set()   # coords of tiles whose text has changed since the last parse
+        self.changed_tiles = set()      # coords of tiles whose contents changed during the last process_input()
+        self.run_phase("parse", self.parse_rules_from_board)
+
+        # one list of operations per board-changing step; see record_operation()
+        self.history = []
+        self.keep_history = True        # when disabled, steps are applied without being added to history
+        self.step_operations = None     # operations of the step in progress (None outside of a step)
+        self.last_operations = []       # operations applied by the last process_input() (e.g. for animation)
 
         self.has_won = False
 
     # Primary API method; handles all processing for a given input key
     # Returns true iff board state is changed
     def process_input(self, key):
-        if self.logging: print("\nprocess_input(%s)" % key)
+        start_time = None
+        if self.hooks:
+            for hook in self.hooks:
+                hook.on_input(self, key)
+            start_time = time.perf_counter()
 
         board_state_changed = False
+        self.changed_tiles = set()
+        self.last_operations = []
 
         if key == Level.UNDO:
-            if len(self.board_history) > 0:
-                self.board = self.board_history.pop()
-                self.parse_rules_from_board()
+            if len(self.history) > 0:
+                operations = self.history.pop()
+                self.run_phase("undo", self.revert_operations, operations)
+                self.last_operations = [(entity, to_coords, from_coords, None)
+                                        for entity, from_coords, to_coords, _ in reversed(operations)]
+                self.run_phase("parse", self.parse_rules_from_board, True)
                 board_state_changed = True
         elif key == Level.RESTART:
-            if len(self.board_history) > 0:
-                self.board = self.board_history[0]
-                self.board_history.clear()
-                self.parse_rules_from_board()
+            if len(self.history) > 0:
+                self.run_phase("restart", self.reset_board)
+                self.run_phase("parse", self.parse_rules_from_board)
                 board_state_changed = True
         else:
-            old_board = board_copy(self.board)
+            self.step_operations = []
 
             # handle motion
-            board_state_changed |= self.handle_motion(key)
+            board_state_changed |= self.run_phase("motion", self.handle_motion, key)
 
             # apply proactive rules
-            board_state_changed |= self.apply_proactive_rules()
+            board_state_changed |= self.run_phase("proactive", self.apply_proactive_rules)
             
             # re-parse rules (only when board state has been changed)
             if board_state_changed:
-                self.parse_rules_from_board()
+                self.run_phase("parse", self.parse_rules_from_board, True)
 
             # apply reactive rules
-            board_state_changed |= self.apply_reactive_rules()
-        
-            # add copy of old board to state to history (if necessary)
-            if board_state_changed:
-                self.board_history.append(old_board)
+            board_state_changed |= self.run_phase("reactive", self.apply_reactive_rules)
         
+            # add the step's operations to history (if any were applied)
+            if self.step_operations:
+                if self.keep_history:
+                    self.history.append(self.step_operations)
+                board_state_changed = True
+            self.last_operations = self.step_operations
+            self.step_operations = None
+
+        if self.hooks:
+            elapsed = time.perf_counter() - start_time
+            for hook in self.hooks:
+                hook.on_step(self, key, board_state_changed, elapsed)
+
         return board_state_changed
 
+    # Puts the board back into its starting state and clears the history (RESTART)
+    def reset_board(self):
+        self.board = self.start_board[:]    # rows are copied on first modification
+        self.owned_rows = set()
+        self.board_hash = self.compute_board_hash()
+        self.build_spatial_index()
+        self.owned_positions = set(all_entities)
+        self.owns_occupied_tiles = True
+        self.changed_tiles = {(x, y) for x in range(self.width) for y in range(self.height)}
+        self.history.clear()
+
+    # Subscribes the given instrumentation.LevelHook to this level's phase timings, counters and rule changes
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    # Runs one phase of a step, i.e. method(*args), and returns its result
+    # While any hooks are attached, the phase is timed and reported to them along with the counters it collected
+    def run_phase(self, phase, method, *args):
+        if not self.hooks:
+            return method(*args)
+
+        self.phase_counters = Counter()
+        start_time = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - start_time
+        for hook in self.hooks:
+            hook.on_phase(self, phase, elapsed, self.phase_counters)
+        return result
+
+    # Returns an independent copy of this level in its current state (with no hooks attached)
+    # Without keep_history, the copy starts with an empty history and does not record one (e.g. for search)
+    # The board rows and spatial index are shared copy-on-write between the two levels, so forking costs
+    # O(height) and each level later pays only for the rows it actually changes
+    def fork(self, keep_history=True):
+        level = copy.copy(self)
+        level.board = self.board[:]
+        level.hooks = []
+
+        # everything is shared now, so neither level may modify any of it in place
+        self.owned_rows, level.owned_rows = set(), set()
+        self.owned_positions, level.owned_positions = set(), set()
+        self.owns_occupied_tiles = level.owns_occupied_tiles = False
+        level.entity_positions = self.entity_positions.copy()
+
+        level.rule_counts = self.rule_counts.copy()
+        level.window_rules = self.window_rules.copy()
+        level.dirty_text_tiles = self.dirty_text_tiles.copy()
+        level.changed_tiles = set()
+        level.last_operations = []
+
+        level.history = self.history[:] if keep_history else []
+        level.keep_history = keep_history
+        return level
+
+    # Forks are fully independent, so cloning is forking
+    def clone(self, keep_history=True):
+        return self.fork(keep_history)
+
+    # Returns the tile at (x, y) for modification, first copying its row if the row may be shared with a fork
+    def get_writable_tile(self, x, y):
+        if y not in self.owned_rows:
+            self.board[y] = [tile[:] for tile in self.board[y]]
+            self.owned_rows.add(y)
+        return self.board[y][x]
+
+    # Returns the entity_positions map of the given entity for modification, copying it first if it may be shared
+    def get_writable_positions(self, entity):
+        if entity not in self.owned_positions:
+            self.entity_positions[entity] = self.entity_positions[entity].copy()
+            self.owned_positions.add(entity)
+        return self.entity_positions[entity]
+
+    # Returns self.occupied_tiles for modification, copying it first if it may be shared
+    def get_writable_occupied_tiles(self):
+        if not self.owns_occupied_tiles:
+            self.occupied_tiles = self.occupied_tiles.copy()
+            self.owns_occupied_tiles = True
+        return self.occupied_tiles
+
     def get_tile_at(self, x, y):
         return self.board[y][x]
 
+    # 64-bit Zobrist hash of the current board; maintained incrementally by add_entity() and remove_entity()
+    # Equal boards hash equally regardless of the order of entities within each tile
+    @property
+    def state_hash(self):
+        return self.board_hash
+
+    # Computes the Zobrist hash of the current board from scratch
+    def compute_board_hash(self):
+        board_hash = 0
+        for y in range(self.height):
+            for x in range(self.width):
+                for entity in self.get_tile_at(x, y):
+                    board_hash += self.zobrist_keys[entity][y * self.width + x]
+        return board_hash & HASH_MASK
+
+    # Rebuilds self.entity_positions and self.occupied_tiles from the current board
+    def build_spatial_index(self):
+        self.entity_positions = {entity: {} for entity in all_entities}
+        self.occupied_tiles = set()
+        for y, row in enumerate(self.board):
+            for x, tile in enumerate(row):
+                for entity in tile:
+                    positions = self.entity_positions[entity]
+                    positions[(x, y)] = positions.get((x, y), 0) + 1
+                if tile:
+                    self.occupied_tiles.add((x, y))
+
+    # Returns the set of coords of the tiles holding at least one of the given entities
+    def get_tiles_containing(self, entities):
+        tiles = set()
+        for entity in entities:
+            tiles.update(self.entity_positions[entity])
+        return tiles
+
+    # Returns the set of coords of the tiles holding at least one entity with the given property
+    def get_tiles_with_property(self, adjective):
+        bit = ADJECTIVE_BITS[adjective]
+        return self.get_tiles_containing(e for e in all_entities if self.property_table[e] & bit)
+
     # Handles all level motion (assumes that self.rules_dict is constant); returns true iff board state is changed
     def handle_motion(self, direction_key):
-        if direction_key not in (Level.UP, Level.DOWN, Level.LEFT, Level.RIGHT):
+        if direction_key not in Level.DIRECTION_VECTORS:
             return False
 
-        if self.logging: print("\thandle_motion(%s)" % direction_key)
+        properties = self.property_table
+        you_bit = ADJECTIVE_BITS[Adjectives.YOU]
 
+        # YOUs move in row-major board order (and in tile order within a tile)
         yous = []
-        for y in range(self.height):
-            for x in range(self.width):
-                for entity in self.get_tile_at(x, y):
-                    if self.get_ruling(entity, Verbs.IS, Adjectives.YOU):
-                        yous.append((entity, (x, y)))
+        for coords in sorted(self.get_tiles_with_property(Adjectives.YOU), key=lambda coords: (coords[1], coords[0])):
+            for entity in self.get_tile_at(*coords):
+                if properties[entity] & you_bit:
+                    yous.append((entity, coords))
+
+        if self.hooks:
+            self.phase_counters["yous"] = len(yous)
 
         if len(yous) == 0:
-            if self.logging: print("\t\tyou are nothing!!!")
             return False
 
-        displacement_vector = {
-            Level.UP: (0, -1),
-            Level.DOWN: (0, 1),
-            Level.LEFT: (-1, 0),
-            Level.RIGHT: (1, 0)
-        }[direction_key]
+        displacement_vector = Level.DIRECTION_VECTORS[direction_key]
 
         board_state_changed = False
-        for you in yous:
-            entity, starting_coords = you
-            target_coords = vector_sum(starting_coords, displacement_vector)
-
-            # scan in direction of displacement vector for level bounds, STOP Objects, and PUSH Objects
-            moves = [(entity, starting_coords, target_coords)]
-            scanning_coords = target_coords
-            stopped = False
-            while True:
-                if not self.is_walkable(scanning_coords):
-                    stopped = True
-                    break
-
-                scanning_tile = self.get_tile_at(*scanning_coords)
-                contains_pushable = False
-                for e in scanning_tile:
-                    if self.get_ruling(e, Verbs.IS, Adjectives.PUSH):
-                        moves.append((e, scanning_coords, vector_sum(scanning_coords, displacement_vector)))
-                        contains_pushable = True
-
-                if not contains_pushable:  # empty tile encountered
-                    break
-
-                scanning_coords = vector_sum(scanning_coords, displacement_vector)
+        for entity, starting_coords in yous:
+            moves, stopped = self.scan_motion(entity, starting_coords, displacement_vector)
+
+            if self.hooks:
+                self.phase_counters["tiles_scanned"] += len(moves)
 
             # move entity
             if not stopped:
                 board_state_changed = True
                 for move in moves:
                     self.move_entity(*move)
+                if self.hooks:
+                    self.phase_counters["moves"] += len(moves)
 
         return board_state_changed
 
+    # Scans from the given entity's coords in the direction of the displacement vector for level bounds, STOP Objects,
+    # and PUSH Objects; returns (the moves of the entity and everything it would push, whether the motion is stopped)
+    def scan_motion(self, entity, starting_coords, displacement_vector):
+        properties = self.property_table
+        push_bit = ADJECTIVE_BITS[Adjectives.PUSH]
+
+        target_coords = vector_sum(starting_coords, displacement_vector)
+        moves = [(entity, starting_coords, target_coords)]
+        scanning_coords = target_coords
+        while True:
+            if not self.is_walkable(scanning_coords):
+                return moves, True
+
+            scanning_tile = self.get_tile_at(*scanning_coords)
+            contains_pushable = False
+            for e in scanning_tile:
+                if properties[e] & push_bit:
+                    moves.append((e, scanning_coords, vector_sum(scanning_coords, displacement_vector)))
+                    contains_pushable = True
+
+            if not contains_pushable:  # empty tile encountered
+                return moves, False
+
+            scanning_coords = vector_sum(scanning_coords, displacement_vector)
+
+    # Returns true iff process_input(key) would change the board or win the level; changes nothing
+    # Exact with respect to process_input(): the first YOU (in motion order) whose scan is not stopped on the
+    # current board always moves, and without motion the reactive pass acts iff one of its conditions already holds
+    def would_change(self, key):
+        if key in (Level.UNDO, Level.RESTART):
+            return len(self.history) > 0
+        return self.can_move(key) or self.has_pending_reactions()
+
+    # Returns the given input keys (default: all of them) for which would_change() is true, in the same order
+    def legal_moves(self, keys=INPUT_KEYS):
+        pending_reactions = None    # the same for every key, so only checked once (and only if needed)
+        legal = []
+        for key in keys:
+            if key in (Level.UNDO, Level.RESTART):
+                changes = len(self.history) > 0
+            elif self.can_move(key):
+                changes = True
+            else:
+                if pending_reactions is None:
+                    pending_reactions = self.has_pending_reactions()
+                changes = pending_reactions
+            if changes:
+                legal.append(key)
+        return legal
+
+    # Returns true iff handle_motion(key) would move anything
+    def can_move(self, direction_key):
+        displacement_vector = Level.DIRECTION_VECTORS.get(direction_key)
+        if displacement_vector is None:
+            return False
+
+        you_bit = ADJECTIVE_BITS[Adjectives.YOU]
+        for entity, positions in self.entity_positions.items():
+            if self.property_table[entity] & you_bit:
+                for coords in positions:
+                    if not self.scan_motion(entity, coords, displacement_vector)[1]:
+                        return True
+        return False
+
+    # Returns true iff apply_reactive_rules() would change the board or win the level if run on the current board
+    # (apply_proactive_rules() never changes anything yet, so it has nothing pending)
+    def has_pending_reactions(self):
+        properties = self.property_table
+        you_bit = ADJECTIVE_BITS[Adjectives.YOU]
+        win_bit = ADJECTIVE_BITS[Adjectives.WIN]
+        defeat_bit = ADJECTIVE_BITS[Adjectives.DEFEAT]
+        sink_bit = ADJECTIVE_BITS[Adjectives.SINK]
+
+        # tiles where a YOU would be destroyed or win (usually few, so YOU tiles are looked up in them, not scanned)
+        hazard_bits = defeat_bit if self.has_won else defeat_bit | win_bit
+        hazard_tiles = self.get_tiles_containing(e for e in all_entities if properties[e] & hazard_bits)
+
+        for entity, positions in self.entity_positions.items():
+            if not positions:
+                continue
+            if entity in self.transform_table:
+                return True
+
+            entity_properties = properties[entity]
+            if entity_properties & sink_bit:
+                if any(len(self.get_tile_at(*coords)) > 1 for coords in positions):
+                    return True
+            if entity_properties & you_bit and hazard_tiles:
+                if any(coords in hazard_tiles for coords in positions):
+                    return True
+        return False
+
     def is_in_bounds(self, tile_coords):
         return 0 <= tile_coords[0] < self.width and 0 <= tile_coords[1] < self.height
 
@@ -160,12 +436,81 @@ class Level:
         if not self.is_in_bounds(tile_coords):
             return False
 
-        tile = self.get_tile_at(*tile_coords)
-        return not any(self.get_ruling(e, Verbs.IS, Adjectives.STOP) for e in tile)
+        stop_bit = ADJECTIVE_BITS[Adjectives.STOP]
+        properties = self.property_table
+        return not any(properties[e] & stop_bit for e in self.get_tile_at(*tile_coords))
 
     def move_entity(self, entity, starting_coords, ending_coords):
-        self.get_tile_at(*starting_coords).remove(entity)
-        self.get_tile_at(*ending_coords).append(entity)
+        index = self.remove_entity(entity, starting_coords)
+        self.add_entity(entity, ending_coords)
+        self.record_operation(entity, starting_coords, ending_coords, index)
+
+    # spawns one entity at given coords
+    def create_entity(self, entity, tile_coords):
+        self.add_entity(entity, tile_coords)
+        self.record_operation(entity, None, tile_coords, None)
+
+    # Places one entity in the tile at given coords, on top unless an index is given
+    # (all board insertions go through here, keeping the board hash and the spatial index up to date)
+    def add_entity(self, entity, tile_coords, index=None):
+        tile = self.get_writable_tile(*tile_coords)
+        if index is None:
+            tile.append(entity)
+        else:
+            tile.insert(index, entity)
+
+        x, y = tile_coords
+        self.board_hash = (self.board_hash + self.zobrist_keys[entity][y * self.width + x]) & HASH_MASK
+        self.changed_tiles.add(tile_coords)
+
+        positions = self.get_writable_positions(entity)
+        positions[tile_coords] = positions.get(tile_coords, 0) + 1
+        if tile_coords not in self.occupied_tiles:
+            self.get_writable_occupied_tiles().add(tile_coords)
+
+        if isinstance(entity, Text):
+            self.dirty_text_tiles.add(tile_coords)
+
+    # Removes one entity from the tile at given coords, the lowest one unless an index is given;
+    # returns the index it was removed from (all board removals go through here, like insertions)
+    def remove_entity(self, entity, tile_coords, index=None):
+        tile = self.get_writable_tile(*tile_coords)
+        if index is None:
+            index = tile.index(entity)
+        del tile[index]
+
+        x, y = tile_coords
+        self.board_hash = (self.board_hash - self.zobrist_keys[entity][y * self.width + x]) & HASH_MASK
+        self.changed_tiles.add(tile_coords)
+
+        positions = self.get_writable_positions(entity)
+        if positions[tile_coords] == 1:
+            del positions[tile_coords]
+        else:
+            positions[tile_coords] -= 1
+        if not tile:
+            self.get_writable_occupied_tiles().discard(tile_coords)
+
+        if isinstance(entity, Text):
+            self.dirty_text_tiles.add(tile_coords)
+        return index
+
+    # Appends one operation to the step in progress; operations are (entity, from_coords, to_coords, index)
+    # where from_coords is None for created entities, to_coords is None for destroyed ones,
+    # and index is the entity's position in its starting tile
+    def record_operation(self, entity, from_coords, to_coords, index):
+        if self.step_operations is not None:
+            self.step_operations.append((entity, from_coords, to_coords, index))
+
+    # Reverts a list of operations by undoing each one in reverse order
+    def revert_operations(self, operations):
+        for entity, from_coords, to_coords, index in reversed(operations):
+            if to_coords is not None:
+                # later arrivals sit on top, so the most recently added copy is the one to take back
+                tile = self.get_tile_at(*to_coords)
+                self.remove_entity(entity, to_coords, len(tile) - 1 - tile[::-1].index(entity))
+            if from_coords is not None:
+                self.add_entity(entity, from_coords, index)
 
     # Adds a given rule to self.rules_dict
     # (object, verb, complement)
@@ -195,7 +540,11 @@ class Level:
         return object_rules[predicate]
 
     # Returns true iff the given rule query is explicitly present in self.rules_dict
+    # (Adjective queries are answered by a single bit test against self.property_table)
     def get_ruling(self, subject, predicate, complement):
+        if predicate is Verbs.IS and complement in ADJECTIVE_BITS:
+            return self.property_table[subject] & ADJECTIVE_BITS[complement] != 0
+
         rule = self.get_rule(subject, predicate)
 
         if rule is None:
@@ -203,95 +552,214 @@ class Level:
 
         return complement in rule
 
+    # Returns true iff the given entity currently has the given property (i.e. 'entity IS adjective')
+    def has_property(self, entity, adjective):
+        return self.property_table[entity] & ADJECTIVE_BITS[adjective] != 0
+
+    # Rebuilds self.property_masks and self.property_table from the 'IS Adjective' rules in self.rules_dict,
+    # and self.transform_table from the 'IS Noun' rules
+    def build_property_table(self):
+        masks = {subject: 0 for subject in [*Objects, Text]}
+        for subject, object_rules in self.rules_dict.items():
+            for complement in object_rules.get(Verbs.IS, ()):
+                if complement in ADJECTIVE_BITS:
+                    masks[subject] |= ADJECTIVE_BITS[complement]
+
+        self.property_masks = masks
+        self.property_table = {
+            entity: masks[Text] if isinstance(entity, Text) else masks[entity]
+            for entity in all_entities
+        }
+
+        self.transform_table = {}
+        for entity in all_entities:
+            complements = self.get_rule(entity, Verbs.IS)
+            if complements is not None:
+                objects = [get_object_from_noun(e) for e in complements if isinstance(e, Nouns)]
+                if len(objects) > 0 and objects != [entity]:    # 'Noun IS itself' alone is a no-op
+                    self.transform_table[entity] = objects
+
     # Call add_rule() on all 'implicit' rules
     def add_implicit_rules(self):
         for rule in self.implicit_rules:
             self.add_rule(*rule)
 
     # Scans the board for valid text patterns and calls add_rule() on all matches
+    # In incremental mode, only the windows overlapping self.dirty_text_tiles are re-scanned
     # TODO: research how Baba handles case of overlapping text
-    def parse_rules_from_board(self):
-        if self.logging: print("\tparse_rules_from_board()")
+    def parse_rules_from_board(self, incremental=False):
+        if incremental:
+            windows = self.get_windows_containing(self.dirty_text_tiles)
+        else:
+            self.rule_counts.clear()
+            self.window_rules.clear()
+            windows = self.get_all_windows()
+        self.dirty_text_tiles.clear()
+
+        rules_changed = not incremental
+        for window in windows:
+            old_rules = self.window_rules.pop(window, frozenset())
+            new_rules = self.parse_window(*window)
+            if new_rules:
+                self.window_rules[window] = new_rules
+
+            if new_rules != old_rules:
+                rules_changed = True
+                for rule in old_rules:
+                    self.rule_counts[rule] -= 1
+                    if self.rule_counts[rule] == 0:
+                        del self.rule_counts[rule]
+                self.rule_counts.update(new_rules)
+
+        # rules spelled out by untouched windows survive as-is; only rebuild the lookup tables on change
+        if rules_changed:
+            self.build_rule_tables()
+
+        if self.hooks:
+            self.phase_counters["windows"] += len(windows)
+            self.phase_counters["rules"] = len(self.rule_counts)
+            if rules_changed:
+                for hook in self.hooks:
+                    hook.on_rules_changed(self, frozenset(self.rule_counts))
+
+    # Rebuilds self.rules_dict and the property/transform tables from self.rule_counts
+    # (or fetches them from self.rule_table_cache if another Level has already built them for the same rules)
+    def build_rule_tables(self):
+        if self.rule_table_cache is not None:
+            rules = frozenset(self.rule_counts)
+            if rules in self.rule_table_cache:
+                self.rules_dict, self.property_masks, self.property_table, self.transform_table = \
+                    self.rule_table_cache[rules]
+                return
 
-        self.rules_dict.clear()
+        self.rules_dict = {}
         self.add_implicit_rules()
-
-        candidate_sequences = []    # set of tuples of tiles representing all contiguous orthogonal text sequences
-
-        # horizontal scan
-        for x in range(self.width - MAX_RULE_LENGTH + 1):
-            for y in range(self.height):
-                tiles = [self.get_tile_at(x + offset, y) for offset in range(MAX_RULE_LENGTH)]
-                filtered_tiles = tuple(list(filter(lambda e: isinstance(e, Text), tile)) for tile in tiles)
-                if all(tile for tile in filtered_tiles):
-                    candidate_sequences.append(filtered_tiles)
-
-        # vertical scan
-        for x in range(self.width):
-            for y in range(self.height - MAX_RULE_LENGTH + 1):
-                tiles = [self.get_tile_at(x, y + offset) for offset in range(MAX_RULE_LENGTH)]
-                filtered_tiles = tuple(list(filter(lambda e: isinstance(e, Text), tile)) for tile in tiles)
-                if all(tile for tile in filtered_tiles):
-                    candidate_sequences.append(filtered_tiles)
-        
-        # loop over all candidate sequences
-        for sequence in candidate_sequences:
-            # loop over all possible interpretations of sequence (cartesian product)
-            for texts in itertools.product(*sequence):
-                if any(matches_pattern(pattern, texts) for pattern in RULE_PATTERNS):
-                    self.add_rule(get_object_from_noun(texts[0]), texts[1], texts[2])
-
-        if self.logging: print("\t\trules_dict:", self.rules_dict)
+        for rule in self.rule_counts:
+            self.add_rule(*rule)
+        self.build_property_table()
+
+        if self.rule_table_cache is not None:
+            self.rule_table_cache[rules] = \
+                (self.rules_dict, self.property_masks, self.property_table, self.transform_table)
+
+    # Returns the frozenset of rules spelled out by the text window starting at (x, y) in direction (dx, dy)
+    # Stacked text is matched position by position: each tile's set of texts is intersected with what each
+    # compiled pattern accepts there, so only valid (noun, verb, complement) triples are ever generated
+    def parse_window(self, x, y, dx, dy):
+        sequence = []   # the set of texts in each tile of the window
+        for offset in range(MAX_RULE_LENGTH):
+            texts = {e for e in self.get_tile_at(x + dx * offset, y + dy * offset) if isinstance(e, Text)}
+            if not texts:
+                return frozenset()
+            sequence.append(texts)
+
+        if self.hooks:
+            self.phase_counters["candidate_sequences"] += 1
+            self.phase_counters["cartesian_product_size"] += math.prod(len(texts) for texts in sequence)
+
+        rules = set()
+        for subjects, verbs, complements in COMPILED_RULE_PATTERNS:
+            subjects = sequence[0] & subjects
+            verbs = sequence[1] & verbs
+            complements = sequence[2] & complements
+            if subjects and verbs and complements:
+                for subject in subjects:
+                    subject = get_object_from_noun(subject)
+                    for verb in verbs:
+                        for complement in complements:
+                            rules.add((subject, verb, complement))
+
+        return frozenset(rules)
+
+    # Returns every horizontal and vertical window of length MAX_RULE_LENGTH as (x, y, dx, dy)
+    def get_all_windows(self):
+        horizontal = [
+            (x, y, 1, 0)
+            for x in range(self.width - MAX_RULE_LENGTH + 1)
+            for y in range(self.height)
+        ]
+        vertical = [
+            (x, y, 0, 1)
+            for x in range(self.width)
+            for y in range(self.height - MAX_RULE_LENGTH + 1)
+        ]
+        return horizontal + vertical
+
+    # Returns the set of windows (x, y, dx, dy) that contain any of the given tile coords
+    def get_windows_containing(self, tile_coords):
+        windows = set()
+        for x, y in tile_coords:
+            for offset in range(MAX_RULE_LENGTH):
+                if 0 <= x - offset <= self.width - MAX_RULE_LENGTH:
+                    windows.add((x - offset, y, 1, 0))
+                if 0 <= y - offset <= self.height - MAX_RULE_LENGTH:
+                    windows.add((x, y - offset, 0, 1))
+        return windows
 
     # Applies all 'proactive' rules (i.e MOVE, MAKE(?)); returns true iff board state is changed
     def apply_proactive_rules(self):
-        if self.logging: print("\tapply_proactive_rules()")
         return False  # TODO
 
     # Applies all 'reactive' rules (i.e. WIN, SINK, DEFEAT, Noun IS Noun); returns true iff board state is changed
     def apply_reactive_rules(self):
-        if self.logging: print("\tapply_reactive_rules()")
+        properties = self.property_table
+        transforms = self.transform_table
+        you_bit = ADJECTIVE_BITS[Adjectives.YOU]
+        win_bit = ADJECTIVE_BITS[Adjectives.WIN]
+        defeat_bit = ADJECTIVE_BITS[Adjectives.DEFEAT]
+        sink_bit = ADJECTIVE_BITS[Adjectives.SINK]
+
+        # only tiles holding a YOU, a SINK, or an entity that transforms can be affected
+        # (visited in the same x-major order as a full scan of the board)
+        reactive_entities = [e for e in all_entities if properties[e] & (you_bit | sink_bit) or e in transforms]
+        reactive_tiles = sorted(self.get_tiles_containing(reactive_entities))
+
+        if self.hooks:
+            self.phase_counters["tiles_checked"] = len(reactive_tiles)
+            self.phase_counters["entities_scanned"] = sum(len(self.get_tile_at(*coords)) for coords in reactive_tiles)
 
         board_state_changed = False
-        for x in range(self.width):
-            for y in range(self.height):
-                tile = self.get_tile_at(x, y)
-                for entity in tile[:]:  # iterate over copy of tile to avoid concurrent modification issues
-
-                    # check for YOU intersections (WIN is checked last)
-                    if self.get_ruling(entity, Verbs.IS, Adjectives.YOU):
-                        if any(self.get_ruling(e, Verbs.IS, Adjectives.DEFEAT) for e in tile):  # YOU/DEFEAT
-                            self.destroy_entity(entity, (x, y))
-                            board_state_changed = True
-                        if any(self.get_ruling(e, Verbs.IS, Adjectives.WIN) for e in tile):  # YOU/WIN
-                            self.has_won = True
-
-                    # check for SINK intersections
-                    if self.get_ruling(entity, Verbs.IS, Adjectives.SINK):
-                        if len(tile) > 1:
-                            for e in tile[:]:
-                                self.destroy_entity(e, (x, y))
-                            board_state_changed = True
-
-                    # check for Noun IS Noun
-                    complements = self.get_rule(entity, Verbs.IS)
-                    if complements is not None:
-                        objects = [get_object_from_noun(e) for e in complements if isinstance(e, Nouns)]
-                        if len(objects) > 0:
-                            tile.remove(entity)
-                            tile += objects
+        for x, y in reactive_tiles:
+            tile = self.get_tile_at(x, y)
+            for entity in tile[:]:  # iterate over copy of tile to avoid concurrent modification issues
+                if entity not in tile:  # already destroyed earlier in this pass
+                    continue
+
+                entity_properties = properties[entity]
+
+                # check for YOU intersections (WIN is checked last)
+                if entity_properties & you_bit:
+                    if any(properties[e] & defeat_bit for e in tile):  # YOU/DEFEAT
+                        self.destroy_entity(entity, (x, y))
+                        board_state_changed = True
+                    if any(properties[e] & win_bit for e in tile):  # YOU/WIN
+                        self.has_won = True
+
+                # check for SINK intersections
+                if entity_properties & sink_bit:
+                    if len(tile) > 1:
+                        for e in tile[:]:
+                            self.destroy_entity(e, (x, y))
+                        board_state_changed = True
+
+                # check for Noun IS Noun
+                if entity in transforms and entity in tile:
+                    index = self.remove_entity(entity, (x, y))
+                    self.record_operation(entity, (x, y), None, index)
+                    for obj in transforms[entity]:
+                        self.create_entity(obj, (x, y))
 
         return board_state_changed
 
     # destroys one entity at given coords and spawns all HAS entities
     def destroy_entity(self, entity, tile_coords):
-        tile = self.get_tile_at(*tile_coords)
-        tile.remove(entity)
+        index = self.remove_entity(entity, tile_coords)
+        self.record_operation(entity, tile_coords, None, index)
 
         has = self.get_rule(entity, Verbs.HAS)
         if has is not None:
             for noun in has:
-                tile.append(get_object_from_noun(noun))
+                self.create_entity(get_object_from_noun(noun), tile_coords)
 
 
 # --- Helper Functions --- #
@@ -302,6 +770,14 @@ def matches_pattern(pattern, entities):
                zip(pattern, entities))
 
 
+# Returns a map from all entities to a list of random 64-bit keys, one per tile (indexed by y * width + x)
+# Keys are summed rather than XOR-ed so that stacked copies of the same entity do not cancel out
+@lru_cache(maxsize=8)
+def get_zobrist_keys(width, height):
+    rng = random.Random(ZOBRIST_SEED)
+    return {entity: [rng.getrandbits(64) for _ in range(width * height)] for entity in all_entities}
+
+
 # Returns the object corresponding to the given noun
 def get_object_from_noun(noun):
     return noun_object_map[noun]
@@ -54,3 +54,7 @@ noun_object_map = {
     Nouns.FLAG: Objects.FLAG,
     Nouns.WATER: Objects.WATER
 }
+
+
+# List of every concrete entity (all Objects followed by all Text)
+all_entities = [*Objects, *Nouns, *Adjectives, *Verbs]
@@ -0,0 +1,88 @@
+# Instrumentation for Level: per-phase timers, counters, and a hook API (does not require pygame)
+#
+# Subscribers subclass LevelHook (overriding any of its methods) and are attached with Level.add_hook()
+# Level only times phases and collects counters while at least one hook is attached; otherwise the only cost
+# is one truth test per phase. Nothing here writes to stdout.
+
+from collections import Counter
+
+# Phases of process_input(), in the order they run; UNDO and RESTART run their own phase followed by "parse"
+PHASES = ["motion", "proactive", "parse", "reactive", "undo", "restart"]
+
+
+# Base class for instrumentation subscribers; every method is a no-op by default
+class LevelHook:
+    # Called after each phase with its wall time (seconds) and the counters collected during it, e.g.
+    #   motion:   yous, moves, tiles_scanned
+    #   parse:    windows, candidate_sequences, cartesian_product_size, rules
+    #   reactive: tiles_checked, entities_scanned
+    def on_phase(self, level, phase, elapsed, counters):
+        pass
+
+    # Called whenever a parse changes the set of rules spelled out on the board
+    def on_rules_changed(self, level, rules):
+        pass
+
+    # Called at the start of each process_input(), before the key is handled; raising here rejects the input
+    def on_input(self, level, key):
+        pass
+
+    # Called at the end of each process_input() with its total wall time (seconds)
+    def on_step(self, level, key, changed, elapsed):
+        pass
+
+
+# Accumulates per-phase wall time and counter totals, e.g. for profiling or exporting metrics
+class PhaseTimer(LevelHook):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phase_times = Counter()        # map from phase to total seconds
+        self.phase_calls = Counter()        # map from phase to number of times it ran
+        self.counters = Counter()           # map from "phase.counter" to total
+        self.steps = 0
+        self.step_time = 0.0
+
+    def on_phase(self, level, phase, elapsed, counters):
+        self.phase_times[phase] += elapsed
+        self.phase_calls[phase] += 1
+        for name, value in counters.items():
+            self.counters[phase + "." + name] += value
+
+    def on_step(self, level, key, changed, elapsed):
+        self.steps += 1
+        self.step_time += elapsed
+
+    # Returns a JSON-serializable summary of everything recorded since the last reset()
+    def summary(self):
+        return {
+            "steps": self.steps,
+            "step_time": self.step_time,
+            "phases": {
+                phase: {"calls": self.phase_calls[phase], "time": self.phase_times[phase]}
+                for phase in PHASES if self.phase_calls[phase]
+            },
+            "counters": dict(self.counters)
+        }
+
+
+# Forwards everything to the standard logging module at DEBUG level (what Level(logging=True) attaches)
+# (logging is only imported once a LoggingHook is created, since it roughly doubles the engine's import time)
+class LoggingHook(LevelHook):
+    def __init__(self, logger_name="engine"):
+        import logging
+        self.logger = logging.getLogger(logger_name)
+        self.debug_level = logging.DEBUG
+
+    def on_phase(self, level, phase, elapsed, counters):
+        if self.logger.isEnabledFor(self.debug_level):
+            self.logger.debug("%s: %.3f ms %s", phase, elapsed * 1000, dict(counters))
+
+    def on_rules_changed(self, level, rules):
+        if self.logger.isEnabledFor(self.debug_level):
+            self.logger.debug("rules: %s", sorted(map(str, rules)))
+
+    def on_step(self, level, key, changed, elapsed):
+        if self.logger.isEnabledFor(self.debug_level):
+            self.logger.debug("process_input(%s): changed=%s, %.3f ms", key, changed, elapsed * 1000)
@@ -1,13 +1,15 @@
 # Standalone GUI Applet for creating levels
 
 import os
+import time
+STARTUP_TIME = time.perf_counter()    # taken before the heavy imports, for time-to-first-frame reporting
 os.environ['pg_HIDE_SUPPORT_PROMPT'] = "hide"
 import pygame as pg
 
 from multiprocessing import Process
 
 from ui_helpers import *
-from levels import levels, read_level, write_level, LEVELS_DIR
+from levels import level_pack, read_level, write_level, LEVELS_DIR
 from main import play_level
 from engine import Level, board_copy
 
@@ -170,6 +172,9 @@ def run_editor(board=None):
     if board is None:
         board = [[[] for _ in range(BOARD_DEFAULT_DIMS[0])] for _ in range(BOARD_DEFAULT_DIMS[1])]
 
+    # decode the sprites shown on the board and in the palette
+    preload_entity_images({entity for row in board + PALETTE_BOARD for tile in row for entity in tile})
+
     selected_entity = None
 
     key_mods = pg.key.get_mods()
@@ -200,6 +205,7 @@ def run_editor(board=None):
         root_viewport_rect, main_viewport_rect, palette_viewport_rect =\
             get_viewport_rects(new_screen_width, new_screen_height, board_width, board_height)
         update_screen(screen, board, main_viewport_rect, palette_viewport_rect)
+        entity_atlases.prewarm_around(main_viewport_rect.width // board_width, palette_viewport_rect.width // PALETTE_WIDTH)
     
     # update window caption based off level_filename
     def refresh_caption():
@@ -237,6 +243,7 @@ def run_editor(board=None):
                 new_screen_height = max(event.h, MIN_SCREEN_HEIGHT)
                 screen = get_initialized_screen(new_screen_width, new_screen_height)
                 refresh_layout()
+                report_time_to_first_frame(STARTUP_TIME)
             
             elif event.type == pg.MOUSEBUTTONDOWN:
                 if event.button == 1:
@@ -381,4 +388,4 @@ USAGE_TEXT = """
 if __name__ == "__main__":
     print(USAGE_TEXT)
     run_editor()
-    # run_editor(levels[0])
+    # run_editor(level_pack["level_1"])
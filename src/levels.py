@@ -1,6 +1,12 @@
 # Level board starting states
 
+import argparse
+import gc
+import glob
+import mmap
 import os
+import struct
+from collections import OrderedDict, namedtuple
 
 from entities import *
 
@@ -41,10 +47,57 @@ KEYSTR_DELIMITER = ","
 EMPTY_TILE_STR = "_"
 
 
+# Map from entities to their id byte in binary level files (ids must never be reused or renumbered)
+ENTITY_BYTE_MAP = {
+    Objects.MOMO: 1,
+    Objects.WALL: 2,
+    Objects.ROCK: 3,
+    Objects.FLAG: 4,
+    Objects.WATER: 5,
+
+    Nouns.MOMO: 32,
+    Nouns.WALL: 33,
+    Nouns.ROCK: 34,
+    Nouns.FLAG: 35,
+    Nouns.WATER: 36,
+
+    Verbs.IS: 64,
+    Verbs.HAS: 65,
+
+    Adjectives.YOU: 96,
+    Adjectives.WIN: 97,
+    Adjectives.STOP: 98,
+    Adjectives.PUSH: 99,
+    Adjectives.DEFEAT: 100,
+    Adjectives.SINK: 101,
+}
+
+# Reversed ENTITY_BYTE_MAP
+BYTE_ENTITY_MAP = {v: k for k, v in ENTITY_BYTE_MAP.items()}
+
+# Binary level file (.lvb): header (magic, version, width, height) followed by a run-length-encoded tile stream;
+# each run is (run length, entity count, entity id bytes...) and covers that many identical consecutive tiles
+BINARY_LEVEL_MAGIC = b"MOMO"
+BINARY_LEVEL_VERSION = 1
+BINARY_LEVEL_HEADER = struct.Struct("<4sBHH")
+MAX_RUN_LENGTH = 255
+
+# Binary level pack (.lvp): header (magic, version, level count), a table of each level's offset in the file,
+# then the levels themselves in the .lvb format
+LEVEL_PACK_MAGIC = b"MOMP"
+LEVEL_PACK_HEADER = struct.Struct("<4sBI")
+LEVEL_PACK_OFFSET = struct.Struct("<Q")
+
+
 LEVELS_DIR = os.path.join(os.path.dirname(__file__), "levels")
 SAVED_LEVELS_DIR = os.path.join(LEVELS_DIR, "saved")
 
 
+# Returns every .lvl file under the given directory (including subdirectories), sorted
+def find_level_files(directory=LEVELS_DIR):
+    return sorted(glob.glob(os.path.join(directory, "**", "*.lvl"), recursive=True))
+
+
 # Read a level from a given filename
 def read_level(filename):
     level = []
@@ -90,12 +143,200 @@ def write_level(filename, board):
         f.write(out)
 
 
-# --- Load All Levels --- #
-filenames = ["level_1.lvl", "level_2.lvl", "test.lvl"]
-levels = [
-    read_level(os.path.join(LEVELS_DIR, filename))
-    for filename in filenames
-]
+# Encodes a given board in the binary level format
+def encode_level(board):
+    height, width = len(board), len(board[0])
+    out = bytearray(BINARY_LEVEL_HEADER.pack(BINARY_LEVEL_MAGIC, BINARY_LEVEL_VERSION, width, height))
+
+    tiles = [tile for row in board for tile in row]
+    i = 0
+    while i < len(tiles):
+        tile = tiles[i]
+        if len(tile) > 255:
+            raise ValueError("Invalid board contents; tiles can hold at most 255 entities in a binary level.")
+
+        run = 1
+        while run < MAX_RUN_LENGTH and i + run < len(tiles) and tiles[i + run] == tile:
+            run += 1
+
+        out.append(run)
+        out.append(len(tile))
+        out.extend(ENTITY_BYTE_MAP[e] for e in tile)
+        i += run
+
+    return bytes(out)
+
+
+# Decodes one binary level starting at a given offset of a given buffer; returns (board, offset just past it)
+def decode_level(buffer, offset=0):
+    magic, version, width, height = BINARY_LEVEL_HEADER.unpack_from(buffer, offset)
+    if magic != BINARY_LEVEL_MAGIC:
+        raise ValueError("Invalid binary level; bad magic number.")
+    if version != BINARY_LEVEL_VERSION:
+        raise ValueError(f"Unsupported binary level version {version}.")
+    offset += BINARY_LEVEL_HEADER.size
+
+    tiles = []
+    while len(tiles) < width * height:
+        run, count = buffer[offset], buffer[offset + 1]
+        offset += 2
+        ids = buffer[offset:offset + count]
+        offset += count
+
+        if count == 0:
+            tiles += [[] for _ in range(run)]
+        else:
+            tile = [BYTE_ENTITY_MAP[b] for b in ids]
+            tiles.append(tile)
+            tiles += [tile[:] for _ in range(run - 1)]
+
+    board = [tiles[y * width:(y + 1) * width] for y in range(height)]
+    return board, offset
+
+
+# Read a level from a given binary (.lvb) filename
+def read_level_binary(filename):
+    with open(filename, mode='rb') as f:
+        return decode_level(f.read())[0]
+
+
+# Write a given level-start to a given binary (.lvb) filename
+def write_level_binary(filename, board):
+    if not filename.endswith(".lvb"):
+        raise ValueError(f"Given filename '{filename}' is invalid. Filenames must end with '.lvb'.")
+
+    with open(filename, mode='wb') as f:
+        f.write(encode_level(board))
+
+
+# Write many level-starts into a single binary level pack (.lvp) file
+def write_level_pack(filename, boards):
+    if not filename.endswith(".lvp"):
+        raise ValueError(f"Given filename '{filename}' is invalid. Filenames must end with '.lvp'.")
+
+    blobs = [encode_level(board) for board in boards]
+    offset = LEVEL_PACK_HEADER.size + LEVEL_PACK_OFFSET.size * len(blobs)
+    offsets = []
+    for blob in blobs:
+        offsets.append(offset)
+        offset += len(blob)
+
+    with open(filename, mode='wb') as f:
+        f.write(LEVEL_PACK_HEADER.pack(LEVEL_PACK_MAGIC, BINARY_LEVEL_VERSION, len(blobs)))
+        f.write(b"".join(LEVEL_PACK_OFFSET.pack(offset) for offset in offsets))
+        f.write(b"".join(blobs))
+
+
+# Read every level from a given binary level pack (.lvp) file (memory-mapped, so the file is read in one go)
+def read_level_pack(filename):
+    with open(filename, mode='rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        magic, version, count = LEVEL_PACK_HEADER.unpack_from(buffer, 0)
+        if magic != LEVEL_PACK_MAGIC:
+            raise ValueError("Invalid level pack; bad magic number.")
+        if version != BINARY_LEVEL_VERSION:
+            raise ValueError(f"Unsupported level pack version {version}.")
+
+        offsets = struct.unpack_from("<%dQ" % count, buffer, LEVEL_PACK_HEADER.size)
+
+        # building millions of tile lists would otherwise trigger the cyclic garbage collector over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return [decode_level(buffer, offset)[0] for offset in offsets]
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+
+# Converts a level file between the text (.lvl) and binary (.lvb) formats, based on the filename extensions
+def convert_level(src_filename, dst_filename):
+    board = read_level_binary(src_filename) if src_filename.endswith(".lvb") else read_level(src_filename)
+    if dst_filename.endswith(".lvb"):
+        write_level_binary(dst_filename, board)
+    else:
+        write_level(dst_filename, board)
+
+
+# Index entry for one level file; name is its path relative to the pack directory, without the extension
+LevelInfo = namedtuple("LevelInfo", ["name", "path", "width", "height", "mtime", "entity_count"])
+
+
+# Returns the LevelInfo of a given level file (counts tiles and key-strings without mapping them to entities)
+def read_level_info(name, filename):
+    mtime = os.path.getmtime(filename)
+    with open(filename) as file:
+        lines = [line.rstrip() for line in file.readlines()]
+
+    tiles = [tile for line in lines for tile in line.split(TILE_DELIMITER)]
+    entity_count = sum(len(tile.split(KEYSTR_DELIMITER)) for tile in tiles if tile != EMPTY_TILE_STR)
+    width = len(lines[0].split(TILE_DELIMITER)) if lines else 0
+
+    return LevelInfo(name, filename, width, len(lines), mtime, entity_count)
+
+
+# A directory of levels (including subdirectories), indexed on first use and parsed lazily
+# Parsed boards are kept in an LRU cache and re-read when their file's mtime changes
+class LevelPack:
+    def __init__(self, directory=LEVELS_DIR, cache_size=16):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.index = None               # map from level name to LevelInfo; built by refresh()
+        self.cache = OrderedDict()      # map from level name to (mtime, board), least recently used first
+
+    # (Re-)scans the directory; index entries of files whose mtime has not changed are kept as-is
+    def refresh(self):
+        old_index = self.index or {}
+        self.index = {}
+        for filename in find_level_files(self.directory):
+            name = os.path.splitext(os.path.relpath(filename, self.directory))[0].replace(os.sep, "/")
+            info = old_index.get(name)
+            if info is None or info.mtime != os.path.getmtime(filename):
+                info = read_level_info(name, filename)
+            self.index[name] = info
+
+        for name in list(self.cache):
+            if name not in self.index:
+                del self.cache[name]
+
+    def get_index(self):
+        if self.index is None:
+            self.refresh()
+        return self.index
+
+    def names(self):
+        return list(self.get_index())
+
+    def info(self, name):
+        return self.get_index()[name]
+
+    def __len__(self):
+        return len(self.get_index())
+
+    def __iter__(self):
+        return iter(self.get_index())
+
+    def __contains__(self, name):
+        return name in self.get_index()
+
+    # Returns a fresh copy of the named level's starting board (Levels modify the board they are given)
+    def __getitem__(self, name):
+        info = self.info(name)
+        mtime = os.path.getmtime(info.path)
+
+        if name in self.cache and self.cache[name][0] == mtime:
+            self.cache.move_to_end(name)
+        else:
+            if mtime != info.mtime:
+                self.index[name] = read_level_info(name, info.path)
+            self.cache[name] = (mtime, read_level(info.path))
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return [[tile[:] for tile in row] for row in self.cache[name][1]]
+
+
+# --- The Shipped Levels (indexed and parsed on first access) --- #
+level_pack = LevelPack(LEVELS_DIR)
 
 
 # M = Objects.MOMO
@@ -152,3 +393,26 @@ levels = [
 # ]
 #
 # level_starts = [test_level_1_start, test_level_2_start, test_level_3_start, test_level_4_start]
+
+
+# Command-line converter between level formats
+# Usage: python levels.py convert SRC DST          (.lvl <-> .lvb)
+#        python levels.py pack DST.lvp SRC...      (any number of .lvl/.lvb files into one pack)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert levels between the text and binary formats.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="convert one level between .lvl and .lvb")
+    convert_parser.add_argument("src")
+    convert_parser.add_argument("dst")
+    pack_parser = subparsers.add_parser("pack", help="pack many levels into one .lvp file")
+    pack_parser.add_argument("dst")
+    pack_parser.add_argument("srcs", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_level(args.src, args.dst)
+    else:
+        write_level_pack(args.dst, [
+            read_level_binary(src) if src.endswith(".lvb") else read_level(src)
+            for src in args.srcs
+        ])
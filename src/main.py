@@ -2,11 +2,15 @@
 # August 2019
 
 import os
+import time
+STARTUP_TIME = time.perf_counter()    # taken before the heavy imports, for time-to-first-frame reporting
 os.environ['pg_HIDE_SUPPORT_PROMPT'] = "hide"   # grrr
 
+from analyzer import find_dead_reason
 from engine import Level
-from levels import levels
+from levels import level_pack
 from ui_helpers import *
+from animation import MotionAnimator
 
 # --- UI-Related Constants --- #
 STARTING_SCREEN_WIDTH, STARTING_SCREEN_HEIGHT = 800, 600  # starting dimensions of screen (px)
@@ -20,6 +24,7 @@ VIEWPORT_BACKGROUND_COLOR = (15, 15, 15)
 TARGET_FPS = 60
 INPUT_REPEAT_BUFFER_MS = 300   # time the key must be held for before entering repeat mode
 INPUT_REPEAT_PERIOD_MS = 100   # time between registered inputs when in repeat mode
+ANIMATION_DURATION_MS = 80      # time taken to slide entities between tiles (shorter than INPUT_REPEAT_PERIOD_MS)
 
 
 key_map = {
@@ -39,14 +44,26 @@ key_map = {
 }
 
 
-# Draw the level onto a fresh viewport surface, blit it to the screen, and flip the display
-def update_screen(screen, level, viewport_rect):
-    viewport = pg.Surface((viewport_rect.width, viewport_rect.height))
+# Draw the whole level onto the viewport surface, blit it to the screen, and flip the display
+def update_screen(screen, level, viewport, viewport_rect):
     draw_board_onto_viewport(viewport, level.board, VIEWPORT_BACKGROUND_COLOR)
     screen.blit(viewport, viewport_rect)
     pg.display.update(viewport_rect)
 
 
+# Redraw only the tiles changed by the last input onto the (persistent) viewport surface, then either start
+# sliding the moved entities into place, or blit the tiles to the screen and update just those rects of the display
+def update_changed_tiles(screen, level, viewport, viewport_rect, animator):
+    dirty_rects = draw_tiles_onto_viewport(viewport, level.board, level.changed_tiles, VIEWPORT_BACKGROUND_COLOR)
+    if animator.start(level.board, level.last_operations, level.changed_tiles, VIEWPORT_BACKGROUND_COLOR):
+        return
+
+    screen_rects = [rect.move(viewport_rect.topleft) for rect in dirty_rects]
+    for rect, screen_rect in zip(dirty_rects, screen_rects):
+        screen.blit(viewport, screen_rect, area=rect)
+    pg.display.update(screen_rects)
+
+
 # Size the viewport to both preserve level.board's aspect ratio and respect VIEWPORT_MIN_PADDING
 def get_viewport_rect(screen_width_px, screen_height_px, level_width_tiles, level_height_tiles):
     width_ratio = (screen_width_px - VIEWPORT_MIN_PADDING * 2) // level_width_tiles
@@ -70,21 +87,36 @@ def get_initialized_screen(screen_width_px, screen_height_px):
 
 # Initializes display, listens for keypress's, calls engine API methods, and handles window re-size events
 def play_level(level):
+    # decode the sprites on the board while the display is being initialized
+    preload_entity_images({entity for row in level.board for tile in row for entity in tile})
+
     # initialize screen; VIDEORESIZE event is generated immediately
     screen = get_initialized_screen(STARTING_SCREEN_WIDTH, STARTING_SCREEN_HEIGHT)
 
+    # animation runs independently of input processing; a new input snaps any running animation to its end
+    animator = MotionAnimator(ANIMATION_DURATION_MS, TARGET_FPS)
+
     # initialize keypress vars
     currently_pressed = None
     last_input_timestamp = 0  # ms
     repeating_inputs = False
 
+    # reason the level can no longer be won (see analyzer.py), or None
+    dead_reason = None
+
     # store the input timestamp, send the input to the level, update the screen
     def process_keypress(key):
-        nonlocal last_input_timestamp
+        nonlocal last_input_timestamp, dead_reason
         last_input_timestamp = pg.time.get_ticks()
-        # only update the screen when the board state changes
+        # only update the screen when the board state changes (and then only the changed tiles)
         if level.process_input(key_map[key]):
-            update_screen(screen, level, viewport_rect)
+            update_changed_tiles(screen, level, viewport, viewport_rect, animator)
+
+            # hint at a restart once per dead end
+            reason = find_dead_reason(level)
+            if reason is not None and dead_reason is None:
+                print("\nThis level can no longer be won (%s). Press R to restart or Z to undo." % reason)
+            dead_reason = reason
 
     # restore the initial VIDEORESIZE event (removed in pg 2.1)
     pg.event.post(pg.event.Event(
@@ -115,7 +147,11 @@ def play_level(level):
                 screen = get_initialized_screen(new_screen_width, new_screen_height)
                 pg.display.update()
                 viewport_rect = get_viewport_rect(new_screen_width, new_screen_height, level.width, level.height)
-                update_screen(screen, level, viewport_rect)
+                viewport = pg.Surface((viewport_rect.width, viewport_rect.height))
+                update_screen(screen, level, viewport, viewport_rect)
+                animator.reset(screen, viewport, viewport_rect)
+                report_time_to_first_frame(STARTUP_TIME)
+                entity_atlases.prewarm_around(get_tile_size_px(viewport, level.board))
 
         # handle repeat mode inputs
         if currently_pressed is not None:
@@ -124,10 +160,17 @@ def play_level(level):
             if current_timestamp - last_input_timestamp > INPUT_REPEAT_BUFFER_MS:
                 repeating_inputs = True
 
+            # a held key that can no longer change anything (e.g. walking into a wall) skips the engine entirely
             if repeating_inputs and current_timestamp - last_input_timestamp > INPUT_REPEAT_PERIOD_MS:
-                process_keypress(currently_pressed)
+                if level.would_change(key_map[currently_pressed]):
+                    process_keypress(currently_pressed)
+                else:
+                    last_input_timestamp = current_timestamp
+
+        animator.advance()
 
         if level.has_won:
+            animator.finish()
             print("\nCongrats! You beat the level!")
             pg.time.wait(1000)
             level_alive = False
@@ -135,5 +178,5 @@ def play_level(level):
 
 if __name__ == "__main__":
     # load a test level (with logging disabled)
-    test_level = Level(levels[0], logging=False)
+    test_level = Level(level_pack["level_1"], logging=False)
     play_level(test_level)
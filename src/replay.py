@@ -0,0 +1,211 @@
+# Recording and playing back the inputs of a Level session (does not require pygame)
+#
+# Replay file (.rpl): header (magic, version, checksum interval, length of the starting board), the starting board
+# in the binary level format (see levels.py), then an append-only stream of one-byte records: an input key code per
+# processed input, and after every checksum-interval inputs a CHECKSUM_RECORD byte followed by the 64-bit state hash
+# of the board at that point. A recording cut short (e.g. by a crash) is still a valid replay of its complete records.
+
+import argparse
+import bisect
+import struct
+
+from engine import Level
+from instrumentation import LevelHook
+from levels import decode_level, encode_level
+
+REPLAY_MAGIC = b"MOMR"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct("<4sBII")
+REPLAY_CHECKSUM = struct.Struct("<Q")
+
+# Map from input keys to their record byte (codes must never be reused or renumbered)
+KEY_BYTE_MAP = {
+    Level.UP: 0,
+    Level.DOWN: 1,
+    Level.LEFT: 2,
+    Level.RIGHT: 3,
+    Level.WAIT: 4,
+    Level.UNDO: 5,
+    Level.RESTART: 6,
+}
+
+# Reversed KEY_BYTE_MAP
+BYTE_KEY_MAP = {v: k for k, v in KEY_BYTE_MAP.items()}
+
+CHECKSUM_RECORD = 0xFF
+
+DEFAULT_CHECKSUM_INTERVAL = 64     # inputs between stored checksums
+DEFAULT_KEYFRAME_INTERVAL = 256    # steps between the in-memory keyframes kept by Replay for seeking
+
+READ_CHUNK_SIZE = 1 << 16
+
+
+# Level hook that appends every input the level processes to a replay file (see record_replay())
+# The file is flushed at every checksum, so at most one checksum interval is lost if the process dies
+# Keys outside of Level.INPUT_KEYS are rejected with ValueError before the level steps (the engine treats them as a
+# WAIT, which the replay could not tell apart from the key that was actually sent)
+class ReplayRecorder(LevelHook):
+    def __init__(self, filename, level, checksum_interval=DEFAULT_CHECKSUM_INTERVAL):
+        if level.history or not level.keep_history or level.board != level.start_board:
+            raise ValueError("Replays must be recorded from a level's starting state, with history enabled.")
+        if checksum_interval < 1:
+            raise ValueError("Checksum interval must be at least 1.")
+
+        self.checksum_interval = checksum_interval
+        self.steps = 0
+
+        board_bytes = encode_level(level.start_board)
+        self.file = open(filename, mode='wb')
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, checksum_interval, len(board_bytes)))
+        self.file.write(board_bytes)
+        self.file.flush()
+
+    def on_input(self, level, key):
+        if key not in KEY_BYTE_MAP:
+            raise ValueError(f"Unknown input key {key!r}; only Level.INPUT_KEYS can be recorded.")
+
+    def on_step(self, level, key, changed, elapsed):
+        self.file.write(bytes((KEY_BYTE_MAP[key],)))
+        self.steps += 1
+        if self.steps % self.checksum_interval == 0:
+            self.file.write(bytes((CHECKSUM_RECORD,)))
+            self.file.write(REPLAY_CHECKSUM.pack(level.state_hash))
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Starts recording every input the given level processes (from its starting state) into the given replay file
+# Returns the ReplayRecorder; detach it with level.remove_hook() and close() it to end the recording
+def record_replay(level, filename, checksum_interval=DEFAULT_CHECKSUM_INTERVAL):
+    recorder = ReplayRecorder(filename, level, checksum_interval)
+    level.add_hook(recorder)
+    return recorder
+
+
+# Reads the header and starting board of the replay open in the given binary file
+# Returns (board, checksum interval), leaving the file positioned at the first record
+def read_replay_header(file):
+    header = file.read(REPLAY_HEADER.size)
+    if len(header) < REPLAY_HEADER.size:
+        raise ValueError("Invalid replay; file is truncated.")
+
+    magic, version, checksum_interval, board_length = REPLAY_HEADER.unpack(header)
+    if magic != REPLAY_MAGIC:
+        raise ValueError("Invalid replay; bad magic number.")
+    if version != REPLAY_VERSION:
+        raise ValueError(f"Unsupported replay version {version}.")
+
+    board_bytes = file.read(board_length)
+    if len(board_bytes) < board_length:
+        raise ValueError("Invalid replay; file is truncated.")
+    return decode_level(board_bytes)[0], checksum_interval
+
+
+# Generates the records that follow the header of the replay open in the given binary file, in order:
+# (key, None) for each input and (None, state hash) for each checksum; stops at the end of the last complete record
+def read_replay_records(file):
+    buffer = b""
+    offset = 0
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[offset:] + chunk
+        offset = 0
+        if not buffer:
+            return
+
+        while offset < len(buffer):
+            code = buffer[offset]
+            if code == CHECKSUM_RECORD:
+                if offset + 1 + REPLAY_CHECKSUM.size > len(buffer):
+                    break   # the rest of this checksum is in the next chunk (or was never written)
+                yield None, REPLAY_CHECKSUM.unpack_from(buffer, offset + 1)[0]
+                offset += 1 + REPLAY_CHECKSUM.size
+            elif code in BYTE_KEY_MAP:
+                yield BYTE_KEY_MAP[code], None
+                offset += 1
+            else:
+                raise ValueError(f"Invalid replay; unknown record {code}.")
+
+        if not chunk:
+            return
+
+
+# Streams the given replay file through a new Level, yielding (step number, key, level) after each input
+# (the same Level is yielded every time, so copy it with fork() to keep a particular step)
+# With verify, raises ValueError as soon as the board disagrees with a recorded checksum
+def play_replay(filename, verify=True):
+    with open(filename, mode='rb') as file:
+        board, _ = read_replay_header(file)
+        level = Level(board, logging=False)
+        step = 0
+        for key, checksum in read_replay_records(file):
+            if key is None:
+                if verify and level.state_hash != checksum:
+                    raise ValueError(f"Replay diverged from its recording at step {step}; checksum mismatch.")
+            else:
+                level.process_input(key)
+                step += 1
+                yield step, key, level
+
+
+# A whole replay loaded for random access: seek(step) returns the level as it was after that many inputs
+# Forks of the level are kept in memory as keyframes every keyframe_interval steps (taken lazily, as steps are
+# first reached), so a seek only replays the inputs since the nearest keyframe at or before the target step
+class Replay:
+    def __init__(self, filename, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL, verify=True):
+        if keyframe_interval < 1:
+            raise ValueError("Keyframe interval must be at least 1.")
+        self.keyframe_interval = keyframe_interval
+        self.verify = verify
+
+        self.keys = []          # input key of each step
+        self.checksums = {}     # map from step number to the state hash recorded after it
+        with open(filename, mode='rb') as file:
+            board, self.checksum_interval = read_replay_header(file)
+            for key, checksum in read_replay_records(file):
+                if key is None:
+                    self.checksums[len(self.keys)] = checksum
+                else:
+                    self.keys.append(key)
+
+        self.keyframes = {0: Level(board, logging=False)}   # map from step number to the level after it
+        self.keyframe_steps = [0]                            # sorted keys of self.keyframes
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Returns a new Level in the state reached after the given number of inputs (0 is the starting board)
+    def seek(self, step):
+        if not 0 <= step <= len(self.keys):
+            raise IndexError(f"Step {step} is outside of the replay (0 to {len(self.keys)}).")
+
+        start_step = self.keyframe_steps[bisect.bisect_right(self.keyframe_steps, step) - 1]
+        level = self.keyframes[start_step].fork()
+        for current_step in range(start_step + 1, step + 1):
+            level.process_input(self.keys[current_step - 1])
+
+            checksum = self.checksums.get(current_step)
+            if self.verify and checksum is not None and level.state_hash != checksum:
+                raise ValueError(f"Replay diverged from its recording at step {current_step}; checksum mismatch.")
+
+            if current_step % self.keyframe_interval == 0 and current_step not in self.keyframes:
+                self.keyframes[current_step] = level.fork()
+                bisect.insort(self.keyframe_steps, current_step)
+
+        return level
+
+
+# Command-line replay checker
+# Usage: python replay.py REPLAY...     (plays each replay through the engine and checks every checksum)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that replays still play back as recorded.")
+    parser.add_argument("replays", nargs="+")
+    args = parser.parse_args()
+
+    for filename in args.replays:
+        steps, won = 0, False
+        for steps, _, level in play_replay(filename):
+            won = level.has_won
+        print(f"{filename}: {steps} steps ok{', won' if won else ''}")
@@ -0,0 +1,171 @@
+# Headless game server; hosts many Level sessions in one asyncio event loop (does not require pygame)
+# Usage: python server.py [--host HOST] [--port PORT | --unix PATH] [--max-sessions N]
+#
+# Protocol: newline-delimited JSON in both directions, one session per connection.
+#   client: {"level": NAME}     starts (or switches to) a fresh session on the named level of levels.level_pack
+#   server: {"width": W, "height": H, "step": 0, "tiles": [...], "won": false}
+#   client: {"key": KEY}        sends one input (Level.UP ... Level.RESTART)
+#   server: {"step": N, "changed": BOOL, "tiles": [...], "won": BOOL}, plus "event": "won" on the step that wins
+# "tiles" is a board diff: a list of [x, y, [entity id, ...]] for every tile whose contents changed (every tile in
+# the first reply), with entities numbered as in the binary level format (levels.ENTITY_BYTE_MAP).
+# A request the server cannot handle gets {"error": MESSAGE}; a full server sends one and closes the connection.
+#
+# Each session handles one request at a time and waits for its reply to drain before reading the next one, so a
+# client that sends faster than it reads is held back by the socket (and only that client).
+
+import argparse
+import asyncio
+import json
+
+from engine import Level
+from levels import ENTITY_BYTE_MAP, level_pack
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7777
+DEFAULT_MAX_SESSIONS = 256
+
+MAX_REQUEST_BYTES = 1024            # longest accepted request line
+WRITE_BUFFER_HIGH_WATER = 64 * 1024  # unsent reply bytes per session before it stops reading requests
+
+KEYS = {Level.UP, Level.DOWN, Level.LEFT, Level.RIGHT, Level.WAIT, Level.UNDO, Level.RESTART}
+
+
+# One client's game; turns requests into replies (independent of the transport)
+class Session:
+    def __init__(self, levels=level_pack):
+        self.levels = levels
+        self.level = None
+        self.step = 0
+
+    # Returns the list of [x, y, [entity ids]] entries for the given tile coords of the current board
+    def get_tile_diff(self, tile_coords):
+        return [
+            [x, y, [ENTITY_BYTE_MAP[e] for e in self.level.get_tile_at(x, y)]]
+            for x, y in sorted(tile_coords)
+        ]
+
+    def start(self, name):
+        if not isinstance(name, str) or name not in self.levels:
+            return {"error": f"Unknown level '{name}'."}
+
+        self.level = Level(self.levels[name], logging=False)
+        self.step = 0
+        all_tiles = [(x, y) for y in range(self.level.height) for x in range(self.level.width)]
+        return {
+            "width": self.level.width,
+            "height": self.level.height,
+            "step": self.step,
+            "tiles": self.get_tile_diff(all_tiles),
+            "won": self.level.has_won
+        }
+
+    def send_input(self, key):
+        if self.level is None:
+            return {"error": "No level started; send {\"level\": NAME} first."}
+        if not isinstance(key, str) or key not in KEYS:
+            return {"error": f"Unknown key '{key}'."}
+
+        had_won = self.level.has_won
+        changed = self.level.process_input(key)
+        self.step += 1
+        reply = {
+            "step": self.step,
+            "changed": changed,
+            "tiles": self.get_tile_diff(self.level.changed_tiles),
+            "won": self.level.has_won
+        }
+        if self.level.has_won and not had_won:
+            reply["event"] = "won"
+        return reply
+
+    # Returns the reply to one request line
+    def handle_request(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"error": "Invalid request; expected one JSON object per line."}
+
+        if not isinstance(request, dict):
+            return {"error": "Invalid request; expected one JSON object per line."}
+        if "level" in request:
+            return self.start(request["level"])
+        if "key" in request:
+            return self.send_input(request["key"])
+        return {"error": "Invalid request; expected a 'level' or 'key' field."}
+
+
+class GameServer:
+    def __init__(self, max_sessions=DEFAULT_MAX_SESSIONS, levels=level_pack):
+        self.max_sessions = max_sessions
+        self.levels = levels
+        self.session_count = 0
+
+    async def handle_connection(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH_WATER)
+
+        if self.session_count >= self.max_sessions:
+            await send_message(writer, {"error": "Server is full."})
+            await close_writer(writer)
+            return
+
+        self.session_count += 1
+        session = Session(self.levels)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # over MAX_REQUEST_BYTES
+                    await send_message(writer, {"error": "Request is too long."})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    await send_message(writer, session.handle_request(line))
+                    await asyncio.sleep(0)  # let other sessions run between requests of a pipelining client
+        except ConnectionError:
+            pass
+        finally:
+            self.session_count -= 1
+            await close_writer(writer)
+
+    # Returns a started asyncio.Server listening on the given unix socket path, or else the given host and port
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path, limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_BYTES)
+
+
+# Writes one message and waits until the session's unsent replies are back under the high-water mark
+async def send_message(writer, message):
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+
+async def close_writer(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+
+async def serve(host, port, path, max_sessions):
+    server = await GameServer(max_sessions).start(host, port, path)
+    # the first line of stdout is the listening address (e.g. for a load generator that started this on port 0)
+    print("listening on", path or "%s:%d" % server.sockets[0].getsockname()[:2], flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host Level sessions over a local socket.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a unix socket instead of TCP")
+    parser.add_argument("--max-sessions", type=int, default=DEFAULT_MAX_SESSIONS)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
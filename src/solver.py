@@ -0,0 +1,115 @@
+# Headless breadth-first level solver (does not require pygame)
+# Usage: python solver.py [--max-nodes N] [level files...]   (defaults to every .lvl under LEVELS_DIR)
+
+import argparse
+import os
+import time
+from collections import deque
+
+from analyzer import is_dead
+from engine import Level
+from levels import read_level, find_level_files, LEVELS_DIR
+
+# Inputs explored from every state (UNDO and RESTART never lead anywhere new)
+SEARCH_KEYS = [Level.UP, Level.DOWN, Level.LEFT, Level.RIGHT, Level.WAIT]
+
+DEFAULT_MAX_NODES = 200000
+
+
+# Results of a single search
+class SolverResult:
+    SOLVED = "solved"
+    UNSOLVABLE = "unsolvable"   # the whole reachable state space was exhausted without winning
+    NODE_LIMIT = "node_limit"   # gave up after expanding max_nodes states
+
+    def __init__(self, status, solution, nodes_expanded, states_seen, peak_frontier, elapsed):
+        self.status = status
+        self.solution = solution    # shortest list of input keys that wins the level (None if not solved)
+        self.nodes_expanded = nodes_expanded
+        self.states_seen = states_seen
+        self.peak_frontier = peak_frontier
+        self.elapsed = elapsed      # seconds
+
+    @property
+    def states_per_second(self):
+        return self.states_seen / self.elapsed if self.elapsed > 0 else float("inf")
+
+    def __repr__(self):
+        return "SolverResult(%s, solution_length=%s, nodes_expanded=%d, states_per_second=%.0f, peak_frontier=%d)" % (
+            self.status, None if self.solution is None else len(self.solution),
+            self.nodes_expanded, self.states_per_second, self.peak_frontier
+        )
+
+
+# Breadth-first search for the shortest input sequence that wins the given level (or board)
+def solve(level, max_nodes=DEFAULT_MAX_NODES):
+    if not isinstance(level, Level):
+        level = Level(level, logging=False)
+    root = level.fork(keep_history=False)
+
+    start_time = time.perf_counter()
+
+    # map from each seen state's hash to (parent hash, input key) for path reconstruction
+    parents = {root.state_hash: None}
+    frontier = deque([root])
+    peak_frontier = 1
+    nodes_expanded = 0
+
+    def finish(status, solution=None):
+        return SolverResult(status, solution, nodes_expanded, len(parents), peak_frontier,
+                            time.perf_counter() - start_time)
+
+    while frontier:
+        if nodes_expanded >= max_nodes:
+            return finish(SolverResult.NODE_LIMIT)
+
+        state = frontier.popleft()
+        state_key = state.state_hash
+        nodes_expanded += 1
+
+        # inputs that provably have no effect are skipped without forking or simulating
+        for key in state.legal_moves(SEARCH_KEYS):
+            child = state.fork(keep_history=False)
+            child.process_input(key)
+
+            child_key = child.state_hash
+            if child.has_won:
+                return finish(SolverResult.SOLVED, reconstruct_path(parents, state_key) + [key])
+
+            if child_key not in parents:
+                parents[child_key] = (state_key, key)
+                if not is_dead(child):  # nothing reachable from a dead state can win, so it is not expanded
+                    frontier.append(child)
+
+        peak_frontier = max(peak_frontier, len(frontier))
+
+    return finish(SolverResult.UNSOLVABLE)
+
+
+# Walks the parent links back from the given state hash and returns the inputs leading to it
+def reconstruct_path(parents, state_key):
+    path = []
+    while parents[state_key] is not None:
+        state_key, key = parents[state_key]
+        path.append(key)
+    path.reverse()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify levels by searching for their shortest solutions.")
+    parser.add_argument("filenames", nargs="*", help="level files to solve (default: every .lvl under LEVELS_DIR)")
+    parser.add_argument("--max-nodes", type=int, default=DEFAULT_MAX_NODES, help="search node limit per level")
+    args = parser.parse_args()
+
+    for filename in args.filenames or find_level_files():
+        result = solve(read_level(filename), args.max_nodes)
+        print("%-50s %-10s length=%-4s nodes=%-8d states/s=%-8.0f peak_frontier=%d" % (
+            os.path.relpath(filename, LEVELS_DIR), result.status,
+            "-" if result.solution is None else len(result.solution),
+            result.nodes_expanded, result.states_per_second, result.peak_frontier
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 # --- UI Helpers used by both main and level_editor --- #
 
+from collections import OrderedDict
 from functools import lru_cache
+import json
+import logging
+import os
+import threading
+import time
 import pygame as pg
 
-import tkinter as tk
-from tkinter import filedialog, messagebox
-
 from entities import *
 from assets import src_images
 
@@ -138,30 +141,113 @@ def get_scaled_image(surface, size):
     return pg.transform.smoothscale(surface, (size, size))
 
 
-# Binary search to find font size with correct height to fill tile with 2 chars vertically and 3 horizontally
+# Font used for the text entities, and the range of font sizes get_font searches
+FONT_NAME = "comicsansms"
+FONT_SIZE_RANGE = (8, 200)
+
+# Per-user cache file (outside of the source tree, which may be read-only)
+FONT_METRICS_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "momo-is-you", "font_metrics.json"
+)
+
+
+# Table of the "M" glyph height (px) of a bold system font at the font sizes measured so far
+# Sizes are only measured when first asked for, and the table is persisted to a cache file, so later runs never
+# have to construct fonts just to measure them
+class FontMetrics:
+    def __init__(self, name, cache_path=FONT_METRICS_CACHE_PATH):
+        pg.font.init()
+        self.name = name
+        self.cache_path = cache_path
+        # the table starts over whenever the name resolves to a different font file or pygame is upgraded
+        self.font_path = pg.font.match_font(name, bold=True)
+
+        self.heights = self.load() or {}
+        self.unsaved = False    # whether sizes were measured since the table was loaded or saved
+
+    # Returns the glyph height at the given font size (measuring it if it is not in the table yet)
+    def get_height(self, size):
+        if size not in self.heights:
+            self.heights[size] = max(pg.font.SysFont(self.name, size, bold=True).size("M"))
+            self.unsaved = True
+        return self.heights[size]
+
+    # Saves the table if sizes were measured since it was loaded or last saved
+    def flush(self):
+        if self.unsaved:
+            self.save()
+            self.unsaved = False
+
+    # Returns the cached table for this font, or None if there is no valid one
+    def load(self):
+        try:
+            with open(self.cache_path) as file:
+                entry = json.load(file)[self.name]
+        except (OSError, ValueError, KeyError):
+            return None
+        if entry.get("path") != self.font_path or entry.get("pygame") != pg.version.ver:
+            return None
+        return {int(size): height for size, height in entry["heights"].items()}
+
+    # Writes the table to the cache file (keeping other fonts' tables); the cache is optional, so failures are ignored
+    def save(self):
+        try:
+            with open(self.cache_path) as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            cache = {}
+        cache[self.name] = {"path": self.font_path, "pygame": pg.version.ver, "heights": self.heights}
+
+        temp_path = "%s.%d.tmp" % (self.cache_path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(temp_path, "w") as file:
+                json.dump(cache, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_font_metrics(name):
+    return FontMetrics(name)
+
+
+# Finds the font size with correct height to fill tile with 2 chars vertically and 3 horizontally
+# (binary search over the metrics table, which measures and caches each probed size once; only the result is built)
 @lru_cache(maxsize=20)  # for good measure
 def get_font(name, tile_size_px):
-    pg.font.init()
+    metrics = get_font_metrics(name)
 
-    size_lower_bound = 8
-    size_upper_bound = 200
+    size_lower_bound, size_upper_bound = FONT_SIZE_RANGE
 
     target_size_px = int(tile_size_px * 0.58)
 
-    font = None
     size = target_size_px  # initial guess
     while size_upper_bound - size_lower_bound > 1:
-        font = pg.font.SysFont(name, size, bold=True)
-        text_size_px = max(font.size("M"))
-        error = text_size_px - target_size_px
-        # print(size, error, size_lower_bound, size_upper_bound)
+        probed_size = size
+        error = metrics.get_height(probed_size) - target_size_px
         if error >= 0:
-            size_upper_bound = size
+            size_upper_bound = probed_size
         else:
-            size_lower_bound = size
+            size_lower_bound = probed_size
         size = (size_lower_bound + size_upper_bound) // 2
+    metrics.flush()
+
+    return pg.font.SysFont(name, probed_size, bold=True)
+
+
+# Logs (at DEBUG level, to the "ui" logger) the time from the given time.perf_counter() reading (taken at startup)
+# to the first frame; once per process
+first_frame_reported = False
 
-    return font
+
+def report_time_to_first_frame(start_time):
+    global first_frame_reported
+    if not first_frame_reported:
+        first_frame_reported = True
+        logging.getLogger("ui").debug("time to first frame: %.0f ms", (time.perf_counter() - start_time) * 1000)
 
 
 text_locations = {
@@ -186,65 +272,198 @@ def draw_text_card_onto_tile(tile, color):
     pg.draw.circle(tile, color, (tile_size_px - corner_radius, tile_size_px - corner_radius), corner_radius)
 
 
-# Returns surface of size (tile_size_px, tile_size_px) for the given entity; cached for performance
-@lru_cache(maxsize=len(entity_map) * 2)  # for good measure
-def get_entity_image(entity, tile_size_px):
+# Draws the given entity onto the given (square, fully transparent) tile Surface
+def draw_entity_onto_tile(tile, entity):
+    tile_size_px = tile.get_width()
     if entity_map[entity]["src_image_id"] is not None:
-        # get scaled texture
+        # copy in scaled texture (max-blending onto transparent pixels copies the source exactly)
         src_image = src_images[entity_map[entity]["src_image_id"]]
-        return get_scaled_image(src_image, tile_size_px)
-    else:
+        tile.blit(get_scaled_image(src_image, tile_size_px), (0, 0), special_flags=pg.BLEND_RGBA_MAX)
+    elif isinstance(entity, Text):
         # render text
-        img = pg.Surface((tile_size_px, tile_size_px), pg.SRCALPHA)
-        if isinstance(entity, Text):
-            font = get_font("comicsansms", tile_size_px)
-            text_str = entity_map[entity]["text_str"]
-            if len(text_str) < 4:
-                text_substrings = [text_str]  # 1 line
-            elif len(text_str) == 4:
-                text_substrings = [char for char in text_str[:4]]  # 2x2 grid
-            else:
-                text_substrings = [text_str[:3], text_str[3:]]
+        font = get_font(FONT_NAME, tile_size_px)
+        text_str = entity_map[entity]["text_str"]
+        if len(text_str) < 4:
+            text_substrings = [text_str]  # 1 line
+        elif len(text_str) == 4:
+            text_substrings = [char for char in text_str[:4]]  # 2x2 grid
+        else:
+            text_substrings = [text_str[:3], text_str[3:]]
 
-            if isinstance(entity, Adjectives):
-                draw_text_card_onto_tile(img, entity_map[entity]["text_color"])
-                text_color = (0, 0, 0, 255)
-                blend_mode = pg.BLEND_RGBA_SUB
-            else:
-                text_color = entity_map[entity]["text_color"]
-                blend_mode = pg.BLEND_RGBA_MAX
-
-            text_images = [font.render(substr, True, text_color) for substr in text_substrings]
-            locations = text_locations[len(text_images)]
-            for text_img, loc in zip(text_images, locations):
-                dest = (
-                    tile_size_px * loc[0] - text_img.get_width() // 2,
-                    tile_size_px * loc[1] - text_img.get_height() // 2
-                )
-                img.blit(text_img, dest, special_flags=blend_mode)
+        if isinstance(entity, Adjectives):
+            draw_text_card_onto_tile(tile, entity_map[entity]["text_color"])
+            text_color = (0, 0, 0, 255)
+            blend_mode = pg.BLEND_RGBA_SUB
         else:
-            img.fill(entity_map[entity]["color"])
-        return img
+            text_color = entity_map[entity]["text_color"]
+            blend_mode = pg.BLEND_RGBA_MAX
+
+        text_images = [font.render(substr, True, text_color) for substr in text_substrings]
+        locations = text_locations[len(text_images)]
+        for text_img, loc in zip(text_images, locations):
+            dest = (
+                tile_size_px * loc[0] - text_img.get_width() // 2,
+                tile_size_px * loc[1] - text_img.get_height() // 2
+            )
+            tile.blit(text_img, dest, special_flags=blend_mode)
+    else:
+        tile.fill(entity_map[entity]["color"])
+
+
+# Number of tile sizes whose atlases are kept (the game and the editor's two viewports each use one size)
+ATLAS_CACHE_SIZE = 8
+
+
+# Map from each entity to its slot in an atlas
+atlas_slots = {entity: i for i, entity in enumerate(entity_map)}
+
+
+# Every entity in entity_map rendered at one tile size into a single Surface
+# Slots are rendered on first request (so drawing a board only waits for the sprites it shows); render_all() fills
+# every slot in one pass. images maps each rendered entity to its (tile_size_px, tile_size_px) subsurface
+class EntityAtlas:
+    def __init__(self, cache, tile_size_px):
+        self.cache = cache      # the owning AtlasCache, whose lock is held while rendering
+        self.tile_size_px = tile_size_px
+        self.surface = pg.Surface((tile_size_px * len(entity_map), tile_size_px), pg.SRCALPHA)
+        self.images = {}
+
+    # Returns the image of the given entity, rendering it first if necessary
+    def get_image(self, entity):
+        image = self.images.get(entity)
+        if image is None:
+            with self.cache.lock:
+                image = self.render(entity)
+        return image
+
+    # Renders the given entity into its slot unless already rendered (the cache lock must be held)
+    def render(self, entity):
+        image = self.images.get(entity)
+        if image is None:
+            size = self.tile_size_px
+            image = self.surface.subsurface(pg.Rect(size * atlas_slots[entity], 0, size, size))
+            draw_entity_onto_tile(image, entity)
+            self.images[entity] = image
+        return image
+
+    # Renders every entity (the cache lock must be held)
+    def render_all(self):
+        for entity in entity_map:
+            self.render(entity)
+
+
+# Keeps the atlases of the most recently used tile sizes; atlases for sizes that are likely to be needed next
+# (e.g. while the window is being dragged to a new size) can be rendered ahead of time on a background thread
+class AtlasCache:
+    def __init__(self, max_atlases=ATLAS_CACHE_SIZE):
+        self.max_atlases = max_atlases
+        self.atlases = OrderedDict()    # map from tile size to EntityAtlas, least recently used first
+
+        # atlases are only ever rendered while holding the lock, so fonts are never used from two threads at once
+        self.lock = threading.Lock()
+        self.prewarm_sizes = []         # tile sizes queued for the background thread
+        self.prewarm_thread = None      # None when the background thread is not running
+
+        # a forked child (e.g. the editor's playtest process) must not inherit a lock held by the parent's thread
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset_after_fork)
+
+    # Returns the atlas for the given tile size, creating it first if it is not cached
+    def get_atlas(self, tile_size_px):
+        with self.lock:
+            atlas = self.atlases.get(tile_size_px)
+            if atlas is None:
+                atlas = self.add_atlas(tile_size_px)
+            else:
+                self.atlases.move_to_end(tile_size_px)
+            return atlas
+
+    # Returns the image of the given entity at the given tile size
+    def get_image(self, entity, tile_size_px):
+        return self.get_atlas(tile_size_px).get_image(entity)
+
+    # Caches a new (empty) atlas for the given tile size, evicting the least recently used one if necessary
+    # (the lock must be held)
+    def add_atlas(self, tile_size_px):
+        atlas = EntityAtlas(self, tile_size_px)
+        self.atlases[tile_size_px] = atlas
+        if len(self.atlases) > self.max_atlases:
+            self.atlases.popitem(last=False)
+        return atlas
+
+    # Queues the given tile sizes to be rendered on the background thread (replacing any still queued)
+    def prewarm(self, tile_sizes):
+        with self.lock:
+            self.prewarm_sizes = [size for size in tile_sizes if size > 0 and size not in self.atlases]
+            if self.prewarm_sizes and self.prewarm_thread is None:
+                # not a daemon, so interpreter shutdown waits for the (short) queue instead of tearing down fonts mid-render
+                self.prewarm_thread = threading.Thread(target=self.run_prewarm)
+                self.prewarm_thread.start()
+
+    # Background thread: renders the queued tile sizes one at a time, then exits
+    def run_prewarm(self):
+        while True:
+            with self.lock:
+                if not self.prewarm_sizes:
+                    self.prewarm_thread = None
+                    return
+                tile_size_px = self.prewarm_sizes.pop(0)
+                if tile_size_px not in self.atlases:
+                    self.add_atlas(tile_size_px).render_all()
+
+    # Only the forking thread survives in the child; drop the background thread's lock and queue
+    def reset_after_fork(self):
+        self.lock = threading.Lock()
+        self.prewarm_sizes = []
+        self.prewarm_thread = None
+
+    # Queues the tile sizes neighbouring the given ones (the sizes a window drag reaches next)
+    def prewarm_around(self, *tile_sizes):
+        self.prewarm([size + delta for delta in (1, -1, 2, -2) for size in tile_sizes])
+
+
+entity_atlases = AtlasCache()
+
+
+# Returns surface of size (tile_size_px, tile_size_px) for the given entity (a subsurface of the cached atlas)
+def get_entity_image(entity, tile_size_px):
+    return entity_atlases.get_image(entity, tile_size_px)
+
+
+# Starts decoding (in the background) the image assets needed to draw the given entities
+def preload_entity_images(entities):
+    src_images.preload({
+        entity_map[entity]["src_image_id"] for entity in entities if entity_map[entity]["src_image_id"] is not None
+    })
+
+
+# Returns the side length (px) of the tiles when drawing the given board onto the given viewport
+def get_tile_size_px(viewport, board):
+    return min(viewport.get_width() // len(board[0]), viewport.get_height() // len(board))
+
+
+# Draws the entities of one tile (in draw precedence order) onto the given viewport at tile coords (x, y)
+# (does not reorder tile_contents, which may be shared between forked levels)
+def draw_tile_onto_viewport(viewport, tile_contents, x, y, tile_size_px):
+    loc_px = (tile_size_px * x, tile_size_px * y)
+    atlas = entity_atlases.get_atlas(tile_size_px)
+    for entity in sorted(tile_contents, key=lambda e: entity_map[e]["draw_precedence"]):
+        viewport.blit(atlas.get_image(entity), loc_px)
 
 
 # Assumes given viewport surface has same exact aspect ratio as board (only draws squares)
-# TODO: lerp between locations over some fixed animation timestep (possibly INPUT_REPEAT_PERIOD_MS/2)
+# (motion between steps is animated on top of this by animation.MotionAnimator)
 def draw_board_onto_viewport(viewport, board, bg_color, grid_color=None):
     viewport.fill(bg_color)
 
     board_width, board_height = len(board[0]), len(board)
 
-    tile_size_px = min(viewport.get_width() // board_width, viewport.get_height() // board_height)
+    tile_size_px = get_tile_size_px(viewport, board)
     # print("tile_size_px:\t" + str(tile_size_px))
 
     for y in range(board_height):
         for x in range(board_width):
-            tile_contents = board[y][x]
-            tile_contents.sort(key=lambda e: entity_map[e]["draw_precedence"])
-            for entity in tile_contents:
-                img = get_entity_image(entity, tile_size_px)
-                loc_px = (tile_size_px * x, tile_size_px * y)
-                viewport.blit(img, loc_px)
+            draw_tile_onto_viewport(viewport, board[y][x], x, y, tile_size_px)
 
     if grid_color is not None:
         viewport_width, viewport_height = viewport.get_size()
@@ -261,22 +480,45 @@ def draw_board_onto_viewport(viewport, board, bg_color, grid_color=None):
         viewport.blit(grid_surface, (0, 0))
 
 
+# Redraws only the given tile coords of the board onto an already-drawn viewport (no grid)
+# Returns the list of redrawn rects, relative to the viewport
+def draw_tiles_onto_viewport(viewport, board, tile_coords, bg_color):
+    tile_size_px = get_tile_size_px(viewport, board)
+
+    dirty_rects = []
+    for x, y in tile_coords:
+        rect = pg.Rect(tile_size_px * x, tile_size_px * y, tile_size_px, tile_size_px)
+        viewport.fill(bg_color, rect)
+        draw_tile_onto_viewport(viewport, board[y][x], x, y, tile_size_px)
+        dirty_rects.append(rect)
+
+    return dirty_rects
+
+
 # Tkinter file dialog wrappers
 # https://docs.python.org/3.9/library/dialog.html#native-load-save-dialogs
+# (tkinter is only imported when a dialog is first opened, so importing ui_helpers does not require it)
 
-def ask_open_filename(**options):
+def get_dialog_root():
+    import tkinter as tk
     root = tk.Tk()
     root.withdraw()
+    return root
+
+
+def ask_open_filename(**options):
+    from tkinter import filedialog
+    get_dialog_root()
     return filedialog.askopenfilename(**options)
 
 
 def ask_save_as_filename(**options):
-    root = tk.Tk()
-    root.withdraw()
+    from tkinter import filedialog
+    get_dialog_root()
     return filedialog.asksaveasfilename(**options)
 
 
 def ask_yes_no(title, message):
-    root = tk.Tk()
-    root.withdraw()
-    return messagebox.askyesno(title, message)
\ No newline at end of file
+    from tkinter import messagebox
+    get_dialog_root()
+    return messagebox.askyesno(title, message)
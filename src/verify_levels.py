@@ -0,0 +1,152 @@
+# Parallel verification of a whole levels directory (does not require pygame)
+# Usage: python verify_levels.py [--max-nodes N] [--processes P] [--replay SOLUTIONS.jsonl] [level files...]
+#
+# Solves every level on a process pool and streams one JSON line per level to stdout:
+#   {"file": ..., "status": ..., "solution_length": ..., "wall_time": ..., "solution": [...]}
+# Each solution found is replayed through a fresh Level before it is reported as solved.
+# With --replay, the solutions recorded in a previous run's output are replayed instead of searched for; that takes
+# well under a second, so saving a run's output once and replaying it is the cheap check to run before merging.
+#
+# The exit status is 1 if any level fails. Every level is expected to be solved, except those listed in the
+# expected-statuses file (by default levels/expected_statuses.json, a map from level file to status):
+#   "unsolvable"    the level is unsolvable on purpose (e.g. a sandbox level); it fails if it becomes solvable
+#   "node_limit"    the level is known to need a bigger search than --max-nodes; solving it anyway also passes
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from engine import Level
+from levels import read_level, find_level_files, LEVELS_DIR
+from solver import solve, SolverResult
+
+EXPECTED_STATUSES_PATH = os.path.join(LEVELS_DIR, "expected_statuses.json")
+
+# Statuses reported besides the SolverResult ones
+REPLAYED = "replayed"               # the recorded solution still wins the level
+REPLAY_FAILED = "replay_failed"     # a solution did not win the level when replayed
+NO_SOLUTION = "no_solution"         # --replay was given but no solution was recorded for the level
+ERROR = "error"                     # the level could not be read or simulated
+
+# Default search node limit per level; low enough for a run over the shipped levels to take about a minute on one core
+VERIFY_MAX_NODES = 20000
+
+# Map from expected status to the statuses that pass; levels without an expected status are expected to be solved
+# (a level that has no recorded solution to replay only passes if it is not expected to be solved)
+PASSING_STATUSES = {
+    SolverResult.SOLVED: {SolverResult.SOLVED, REPLAYED},
+    SolverResult.UNSOLVABLE: {SolverResult.UNSOLVABLE, NO_SOLUTION},
+    SolverResult.NODE_LIMIT: {SolverResult.NODE_LIMIT, SolverResult.SOLVED, REPLAYED, NO_SOLUTION},
+}
+
+
+# Returns true iff a level's status fails the run, given the status it is expected to have (or None)
+def is_failure(status, expected_status):
+    return status not in PASSING_STATUSES[expected_status or SolverResult.SOLVED]
+
+
+# Reads the map from level file (relative to LEVELS_DIR) to expected status; a missing file expects nothing
+def read_expected_statuses(filename):
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename) as file:
+        expected_statuses = json.load(file)
+
+    for level_file, status in expected_statuses.items():
+        if status not in PASSING_STATUSES:
+            raise ValueError(f"Invalid expected status '{status}' for {level_file}; expected one of "
+                             f"{', '.join(sorted(PASSING_STATUSES))}.")
+    return expected_statuses
+
+
+# Returns true iff sending the given keys to a fresh Level built from the given board wins it
+def replay_wins(board, solution):
+    level = Level(board, logging=False)
+    for key in solution:
+        level.process_input(key)
+        if level.has_won:
+            return True
+    return False
+
+
+# Worker: solves (or replays the given solution for) one level file and returns its JSON-serializable report
+# task is (filename, max_nodes, solution); max_nodes is None when only replaying
+def verify_level(task):
+    filename, max_nodes, solution = task
+    start_time = time.perf_counter()
+    report = {"file": os.path.relpath(filename, LEVELS_DIR)}
+
+    try:
+        board = read_level(filename)
+        if solution is None and max_nodes is None:
+            status = NO_SOLUTION
+        elif solution is not None:
+            status = REPLAYED if replay_wins(board, solution) else REPLAY_FAILED
+        else:
+            result = solve(board, max_nodes)
+            status, solution = result.status, result.solution
+            if status == SolverResult.SOLVED and not replay_wins(board, solution):
+                status = REPLAY_FAILED
+            report["nodes_expanded"] = result.nodes_expanded
+    except Exception as e:
+        status, solution = ERROR, None
+        report["error"] = repr(e)
+
+    report.update({
+        "status": status,
+        "solution_length": None if solution is None else len(solution),
+        "wall_time": round(time.perf_counter() - start_time, 4),
+        "solution": solution
+    })
+    return report
+
+
+# Reads the solutions recorded in a previous run's JSON lines output; returns a map from level file to solution
+def read_solutions(filename):
+    solutions = {}
+    with open(filename) as file:
+        for line in file:
+            if line.strip():
+                report = json.loads(line)
+                if report.get("solution") is not None:
+                    solutions[report["file"]] = report["solution"]
+    return solutions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify every level in parallel; prints one JSON line per level.")
+    parser.add_argument("filenames", nargs="*", help="level files to verify (default: every .lvl under LEVELS_DIR)")
+    parser.add_argument("--max-nodes", type=int, default=VERIFY_MAX_NODES,
+                        help="search node limit per level (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes (default: one per core)")
+    parser.add_argument("--replay", metavar="SOLUTIONS", help="replay the solutions recorded in a previous run's output")
+    parser.add_argument("--expected", metavar="STATUSES", default=EXPECTED_STATUSES_PATH,
+                        help="JSON map from level file to its expected status (default: levels/expected_statuses.json)")
+    args = parser.parse_args()
+
+    expected_statuses = read_expected_statuses(args.expected)
+
+    filenames = args.filenames or find_level_files()
+    if args.replay:
+        solutions = read_solutions(args.replay)
+        tasks = [(f, None, solutions.get(os.path.relpath(f, LEVELS_DIR))) for f in filenames]
+    else:
+        tasks = [(f, args.max_nodes, None) for f in filenames]
+
+    failed = False
+    with multiprocessing.Pool(min(args.processes, len(tasks)) or 1) as pool:
+        for report in pool.imap_unordered(verify_level, tasks):
+            expected_status = expected_statuses.get(report["file"])
+            if expected_status is not None:
+                report["expected_status"] = expected_status
+            print(json.dumps(report), flush=True)
+            failed |= is_failure(report["status"], expected_status)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()